@@ -1,17 +1,132 @@
+import os
+import time
 import dash
 import dash_bootstrap_components as dbc
+import diskcache
+from dash import DiskcacheManager
+from flask import g, jsonify, request
+from flask_compress import Compress
 from components.sidebar import create_sidebar
+from services.assets import EXTERNAL_STYLESHEETS, VENDOR_IGNORE, stylesheets
+from services.cache import cache_stats
+from services.dataset import get_dataset
+from services.lazy import start_warmup, startup_report
+from services.metrics import callback_name, observe_request, render
+from services import profiling
+from services.reload import start_watcher
 
-external_stylesheets = [
-    'https://fonts.googleapis.com/css2?family=Public+Sans:wght@400;500;600;700;800;900&display=swap',
-    dbc.themes.PULSE,
-    dbc.icons.FONT_AWESOME
-]
+# Background callbacks run in their own process, so a slow figure does not hold a gunicorn worker.
+# Results are cached per dataset version, in a directory every worker shares.
+background_callback_manager = DiskcacheManager(
+    diskcache.Cache(os.environ.get('BACKGROUND_CACHE_DIR', 'data/cache/background')),
+    cache_by=[lambda: get_dataset().version_key],
+    expire=3600
+)
 
-app = dash.Dash(__name__, use_pages=True, external_stylesheets=external_stylesheets)
+# No suppress_callback_exceptions: callbacks are validated against every page's layout, which Dash's pages
+# support collects on the first request. The Home and DataTable layouts read the data, so that request waits
+# for the year list and the location index (the warmup builds them too).
+app = dash.Dash(
+    __name__,
+    use_pages=True,
+    external_stylesheets=EXTERNAL_STYLESHEETS,
+    assets_ignore=VENDOR_IGNORE,
+    background_callback_manager=background_callback_manager
+)
+# Local copies from assets/vendor when they were bundled; their URLs need the app, hence set once it exists
+app.config.external_stylesheets = stylesheets()
 
 server = app.server
 
+# Brotli where the browser accepts it, else gzip, for callback responses, layouts, the index and assets
+server.config.update(
+    COMPRESS_ALGORITHM=os.environ.get('COMPRESS_ALGORITHM', 'br,gzip'),
+    COMPRESS_MIMETYPES=['text/html', 'text/css', 'text/javascript', 'application/javascript',
+                        'application/json', 'image/svg+xml', 'image/x-icon']
+)
+Compress(server)
+
+
+@server.before_request
+def start_callback_timer():
+    if request.path.endswith('_dash-update-component'):
+        g.callback_started = time.perf_counter()
+
+
+@server.before_request
+def sync_added_orders():
+    # Pick up orders added by any worker before a callback reads the aggregates.
+    if request.path.endswith('_dash-update-component'):
+        get_dataset().sync()
+
+
+@server.before_request
+def watch_workbook():
+    # Reload the dataset when the workbook changes; started by the first request of each process, so it runs
+    # in the gunicorn workers rather than in the master they were forked from.
+    start_watcher()
+
+
+@server.after_request
+def cache_versioned_assets(response):
+    # Asset URLs carry their file's version (?m=), so a versioned response never changes and can be kept for good.
+    if request.path.startswith('/assets/') and 'm' in request.args and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+
+@server.before_request
+def start_profile():
+    # Profile one callback request on demand, see services/profiling.py; e.g. replay it from the browser's
+    # devtools with curl -H 'X-Profile: <PROFILE_SECRET>' (add -H 'X-Profile-Format: text' for a summary).
+    if request.path.endswith('_dash-update-component') and profiling.requested(request):
+        output = (request.get_json(silent=True) or {}).get('output')
+        profiling.start(callback_name(app.callback_map, output))
+
+
+@server.after_request
+def finish_profile(response):
+    summary = (request.headers.get('X-Profile-Format') or request.args.get('profile_format')) == 'text'
+    return profiling.finish(response, summary)
+
+
+@server.teardown_request
+def discard_profile(exception):
+    profiling.discard()
+
+
+@server.after_request
+def record_callback_metrics(response):
+    # Latency and payload size per callback; runs before compression, so the sizes are those of the JSON.
+    if 'callback_started' in g:
+        output = (request.get_json(silent=True) or {}).get('output')
+        observe_request(callback_name(app.callback_map, output), g.callback_started, response)
+    return response
+
+
+@server.route('/metrics')
+def metrics():
+    # Prometheus text format, e.g. p99 per callback:
+    # histogram_quantile(0.99, sum by (callback, le) (rate(dash_callback_request_seconds_bucket[5m])))
+    body, content_type = render()
+    return body, 200, {'Content-Type': content_type}
+
+
+@server.route('/_cache-stats')
+def callback_cache_stats():
+    # Hit / miss counters of the memoized callbacks, to size the caches.
+    return jsonify(cache_stats())
+
+
+@server.route('/_startup')
+def page_startup_times():
+    # Seconds the dataset and each page's data took to build, null until built.
+    return jsonify(startup_report())
+
+
 sidebar = create_sidebar()
 
 app.layout = dbc.Container([
@@ -31,6 +146,9 @@ app.layout = dbc.Container([
     )
 ], fluid=True)
 
+# Page data builds on first use; meanwhile a background thread warms it so the first visits find it ready
+start_warmup()
+
 
 if __name__ == "__main__":
     app.run(debug=False)
@@ -0,0 +1,27 @@
+// Callbacks that only rearrange what the browser already holds, run without a round trip to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        // Axis dropdown options without the value picked on the other axis
+        filter_axis_options: function(selected, axis_options) {
+            return axis_options.filter(function(option) {
+                return option.value !== selected;
+            });
+        },
+
+        toggle_modal: function(n1, n2, is_open) {
+            if (n1 || n2) {
+                return !is_open;
+            }
+            return is_open;
+        },
+
+        // Hide the form alert once its interval fired, and stop the interval again
+        clear_alert: function(n_intervals) {
+            var no_update = window.dash_clientside.no_update;
+            if (n_intervals > 0) {
+                return [null, true, 0];
+            }
+            return [no_update, no_update, no_update];
+        }
+    }
+});
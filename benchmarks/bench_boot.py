@@ -0,0 +1,87 @@
+# Compares cold (no Feather cache) and warm (cache hit) boot times, then reports how long the dataset and
+# each page's data take to build once the app is up (they are built lazily, see services/lazy.py).
+# Run from the repository root: python benchmarks/bench_boot.py [--repeat N]
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each sample runs in a fresh interpreter so nothing is shared between boots.
+LOAD_DATASET = """
+import time
+start = time.perf_counter()
+from services.dataset import load_dataset
+load_dataset()
+print(time.perf_counter() - start)
+"""
+
+IMPORT_APP = """
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+"""
+
+WARM_PAGES = """
+import json
+import app
+from services.lazy import startup_report, warm_up
+warm_up()
+print(json.dumps(startup_report()))
+"""
+
+
+def run(template, cache_dir):
+    # The warmup thread is left off, so it does not overlap with what is timed
+    return subprocess.run(
+        [sys.executable, '-c', template],
+        cwd=ROOT, env=dict(os.environ, DATA_CACHE_DIR=cache_dir, WARMUP='off'),
+        check=True, capture_output=True, text=True
+    ).stdout.strip().splitlines()[-1]
+
+
+def run_sample(template, cache_dir):
+    return float(run(template, cache_dir))
+
+
+def measure(template, repeat):
+    cold, warm = [], []
+    for _ in range(repeat):
+        cache_dir = tempfile.mkdtemp(prefix='aldi-cache-')
+        try:
+            cold.append(run_sample(template, cache_dir))
+            warm.append(run_sample(template, cache_dir))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'target':<14}{'cold (s)':>10}{'warm (s)':>10}{'speedup':>10}")
+    for name, template in [('load_dataset', LOAD_DATASET), ('import app', IMPORT_APP)]:
+        cold, warm = measure(template, args.repeat)
+        cold_median, warm_median = statistics.median(cold), statistics.median(warm)
+        print(f"{name:<14}{cold_median:>10.3f}{warm_median:>10.3f}{cold_median / warm_median:>9.1f}x")
+
+    cache_dir = tempfile.mkdtemp(prefix='aldi-cache-')
+    try:
+        print(f"\n{'page data':<14}{'cold (s)':>10}{'warm (s)':>10}")
+        cold, warm = json.loads(run(WARM_PAGES, cache_dir)), json.loads(run(WARM_PAGES, cache_dir))
+        for name in cold:
+            print(f"{name:<14}{cold[name]:>10.3f}{warm[name]:>10.3f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Times the bubble chart breakdown aggregation per breakdown and date range: the previous lambda based
+# pass over the order rows against summing the precomputed per (breakdown, day) partials.
+# Run from the repository root: python benchmarks/bench_breakdown.py [--repeat N]
+import argparse
+import os
+import sys
+import timeit
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: F401,E402  (registers the pages)
+from pages.graph import axis_options, summarize_breakdown  # noqa: E402
+from services.dataset import get_dataset, get_merged  # noqa: E402
+
+BREAKDOWNS = ['Segment', 'Ship Mode', 'Customer Name', 'Category', 'Sub-Category', 'Product Name']
+RANGES = [('2017-01-01', '2017-01-31'), ('2017-01-01', '2017-12-31'), ('2014-01-01', '2017-12-31')]
+
+
+def filter_by_date(df, start_d, end_d):
+    # df is sorted by Order Date, so the range is one contiguous slice located by binary search
+    order_dates = df['Order Date']
+    lo = order_dates.searchsorted(pd.Timestamp(start_d), side='left')
+    hi = order_dates.searchsorted(pd.Timestamp(end_d), side='right')
+    return df.iloc[lo:hi]
+
+
+def lambda_breakdown(df, category):
+    # The aggregation as it was before, with a Python level lambda per group for the returns.
+    grouped_df = df.groupby(category, observed=True).agg({
+        'Row ID': 'count',
+        'Sales': 'sum',
+        'Profit': 'sum',
+        'Discount': 'mean',
+        'Quantity': 'sum',
+        'Days to Ship': 'mean',
+        'Returned': lambda x: (x == 'Yes').sum()
+    }).reset_index()
+
+    grouped_df['Profit Ratio'] = (grouped_df['Profit'] / grouped_df['Sales']) * 100
+    grouped_df['Discount'] = grouped_df['Discount'] * 100
+
+    if category != 'Product Name' and category != 'Sub-Category' and category != 'Category':
+        unique_retuns = df.drop_duplicates(subset='Order ID').groupby(category, observed=True).agg({
+            'Returned': lambda x: (x == 'Yes').sum()
+        }).reset_index()
+
+        grouped_df['Returned'] = unique_retuns['Returned']
+
+    return grouped_df
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def partials_breakdown(category, start_d, end_d):
+    return summarize_breakdown(get_dataset().breakdowns.between(category, start_d, end_d), category)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    metrics = [option['value'] for option in axis_options]
+    df_merged = get_merged()
+    print(f"{len(df_merged)} order rows")
+    print(f"{'breakdown':<16}{'range':>24}{'rows':>7}{'groups':>8}{'lambda (ms)':>14}{'partials (ms)':>16}{'speedup':>10}")
+    for category in BREAKDOWNS:
+        for start_d, end_d in RANGES:
+            rows = filter_by_date(df_merged, start_d, end_d)
+            expected = lambda_breakdown(rows, category)
+            actual = partials_breakdown(category, start_d, end_d)
+            assert (expected[metrics].round(6) == actual[metrics].round(6)).all().all(), (category, start_d, end_d)
+
+            before = best_of(lambda: lambda_breakdown(filter_by_date(df_merged, start_d, end_d), category), args.repeat)
+            after = best_of(lambda: partials_breakdown(category, start_d, end_d), args.repeat)
+            print(f"{category:<16}{start_d + '..' + end_d:>24}{len(rows):>7}{len(actual):>8}"
+                  f"{before:>14.2f}{after:>16.2f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+# Times the initial data load and every page callback on generated datasets of several sizes
+# (see benchmarks/synthetic.py) and writes the results to a JSON file, to compare one commit with another.
+# Callbacks that run in the request are posted to /_dash-update-component, so decoding the request and
+# encoding the response count too; the background Graphs callbacks are called directly. The callback
+# caches are off, every repeat computes.
+# Run from the repository root:
+#   python benchmarks/bench_callbacks.py [--sizes 10000 1000000 10000000] [--repeat N] [--output FILE]
+#                                        [--baseline FILE]
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+# Set before the app is imported: nothing warms the sample workbook and no callback result is kept
+os.environ['WARMUP'] = 'off'
+os.environ['CALLBACK_CACHE_BACKEND'] = 'memory'
+os.environ['CALLBACK_CACHE_SIZE'] = '0'
+
+import pandas as pd  # noqa: E402
+import app  # noqa: E402
+from synthetic import generate  # noqa: E402
+from pages import graph  # noqa: E402
+from pages.table import current_table  # noqa: E402
+from services.dataset import Dataset, apply_schema, set_dataset  # noqa: E402
+from services.order_store import OrderStore  # noqa: E402
+from services.table_query import split_filter_part  # noqa: E402
+
+SIZES = [10000, 1000000, 10000000]
+FULL_RANGE = ('2014-01-01', '2017-12-31')
+
+# (page, name, an output of the callback, changed input, {input: value}) per request; inputs not given are None
+REQUESTS = [
+    ('Home', 'cards', 'sales-col.children', 'year-selector.value', {'year-selector.value': '2016'}),
+    ('Home', 'monthly charts', 'monthly-chart.figure', 'year-selector.value', {'year-selector.value': '2016'}),
+    ('Home', 'timeline chart', 'timeline-chart.figure', 'month-selector.value', {
+        'property-selector.value': 'Profit Ratio', 'year-selector.value': '2016', 'month-selector.value': '3'
+    }),
+    ('Home', 'timeline property switch', 'timeline-chart.figure', 'property-selector.value', {
+        'property-selector.value': 'Profit Ratio', 'year-selector.value': '2016', 'month-selector.value': '3'
+    }),
+    ('Home', 'orders chart', 'orders-chart.figure', 'month-selector.value', {
+        'year-selector.value': '2016', 'month-selector.value': '3'
+    }),
+    ('DataTable', 'states', 'state-dropdown.options', 'country-dropdown.value', {
+        'country-dropdown.value': 'United States'
+    }),
+    ('DataTable', 'cities', 'city-dropdown.options', 'state-dropdown.value', {
+        'country-dropdown.value': 'United States', 'state-dropdown.value': 'Texas'
+    }),
+    ('DataTable', 'table first page', 'records-datatable.page_count', 'records-datatable.page_current', {
+        'records-datatable.page_current': 0, 'records-datatable.page_size': 10,
+        'records-datatable.sort_by': [{'column_id': 'Order Date', 'direction': 'desc'}],
+        'records-datatable.filter_query': ''
+    }),
+    ('DataTable', 'table filtered', 'records-datatable.page_count', 'records-datatable.filter_query', {
+        'country-dropdown.value': 'United States', 'state-dropdown.value': 'Texas',
+        'records-datatable.page_current': 0, 'records-datatable.page_size': 10,
+        'records-datatable.sort_by': [{'column_id': 'Customer Name', 'direction': 'asc'}],
+        'records-datatable.filter_query':
+            '{Sales} s> 100 && {Order Date} sdatestartswith 2016 && {Customer Name} icontains "a"'
+    }),
+    ('DataTable', 'table deep page', 'records-datatable.page_count', 'records-datatable.page_current', {
+        'records-datatable.page_current': 500, 'records-datatable.page_size': 10,
+        'records-datatable.sort_by': [{'column_id': 'Sales', 'direction': 'desc'}],
+        'records-datatable.filter_query': ''
+    }),
+    ('Graphs', 'bubble axis switch', 'bubblechart.figure@', 'yaxis-dropdown.value', {
+        'xaxis-dropdown.value': 'Profit', 'yaxis-dropdown.value': 'Quantity',
+        'breakdown-dropdown.value': 'Product Name',
+        'start-date.date': FULL_RANGE[0], 'end-date.date': FULL_RANGE[1]
+    }),
+]
+
+# (name, function, arguments after set_progress) of the background callbacks
+BACKGROUND = [
+    *[(f'timeline ({granularity})', graph.update_timeline_chart_v2, (*FULL_RANGE, granularity))
+      for granularity in ['week', 'month', 'year']],
+    *[(f'bubble chart ({breakdown})', graph.update_bubble_chart, (breakdown, *FULL_RANGE, 'Profit', 'Sales'))
+      for breakdown in ['Segment', 'Customer Name', 'Product Name']],
+]
+
+
+def no_progress(value):
+    pass
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, result
+
+
+def record(results, size, page, name, samples, size_bytes=None):
+    entry = {
+        'size': size, 'page': page, 'name': name,
+        'median_ms': statistics.median(samples), 'min_ms': min(samples), 'repeat': len(samples)
+    }
+    if size_bytes is not None:
+        entry['bytes'] = size_bytes
+    results.append(entry)
+    print(f"{size:>10,}  {page:<10}{name:<30}{entry['median_ms']:>12.2f}{entry['min_ms']:>12.2f}")
+
+
+def load(size, store_path, results):
+    # Generation is not timed; building the typed frames and each page's aggregates is, once each.
+    sheets = generate(size)
+    samples, orders = timed(lambda: apply_schema(sheets['Orders']), 1)
+    record(results, size, 'load', 'typed frames', samples)
+
+    samples, dataset = timed(lambda: Dataset(orders, sheets['Returns'], OrderStore(store_path)), 1)
+    record(results, size, 'load', 'dataset', samples)
+    set_dataset(dataset)
+    for page, name, build in [
+        ('Home', 'time cube', lambda: dataset.cube),
+        ('Graphs', 'daily stats', lambda: dataset.daily_stats),
+        ('Graphs', 'breakdowns', lambda: dataset.breakdowns),
+        ('DataTable', 'location index', lambda: dataset.geo),
+        ('DataTable', 'table and sort index', lambda: current_table()[1].order('Order Date', False)),
+    ]:
+        samples, _ = timed(build, 1)
+        record(results, size, 'load', f'{name} ({page})', samples)
+    return dataset
+
+
+def request_body(dependency, changed, values):
+    def spec(item):
+        return {**item, 'value': values.get(f"{item['id']}.{item['property']}")}
+
+    output = dependency['output']
+    outputs = [
+        dict(zip(['id', 'property'], item.split('@')[0].rsplit('.', 1)))
+        for item in (output.strip('.').split('...') if output.startswith('..') else [output])
+    ]
+    return {
+        'output': output,
+        'outputs': outputs if output.startswith('..') else outputs[0],
+        'inputs': [spec(item) for item in dependency['inputs']],
+        'state': [spec(item) for item in dependency['state']],
+        'changedPropIds': [changed]
+    }
+
+
+def bench_callbacks(size, dataset, client, dependencies, repeat, results):
+    for page, name, output, changed, values in REQUESTS:
+        dependency = next(dependency for dependency in dependencies if output in dependency['output'])
+        # A clause the parser does not understand is skipped, which would time an unfiltered table
+        query = values.get('records-datatable.filter_query')
+        if query and any(split_filter_part(part)[0] is None for part in query.split(' && ')):
+            raise RuntimeError(f'{name}: filter not parsed: {query}')
+        body = request_body(dependency, changed, values)
+        samples, response = timed(lambda: client.post('/_dash-update-component', json=body), repeat)
+        if response.status_code != 200:
+            raise RuntimeError(f'{name}: {response.status_code} {response.data[:200]}')
+        record(results, size, page, name, samples, len(response.data))
+
+    for name, func, args in BACKGROUND:
+        samples, _ = timed(lambda: func(no_progress, *args), repeat)
+        record(results, size, 'Graphs', name, samples)
+
+    # Last, since the added orders change the table the requests above page through
+    order = dataset.orders.iloc[0]
+    added = iter(range(repeat))
+    values = {
+        'button-add.n_clicks': 1, 'product-id.value': order['Product ID'],
+        'customer-id.value': order['Customer ID'], 'quantity-id.value': '2', 'discount-id.value': '0.1'
+    }
+
+    dependency = next(dependency for dependency in dependencies if 'order-id.value' in dependency['output'])
+
+    def add_order():
+        values['order-id.value'] = f'BENCH-{size}-{next(added)}'
+        return client.post('/_dash-update-component', json=request_body(dependency, 'button-add.n_clicks', values))
+
+    samples, response = timed(add_order, repeat)
+    record(results, size, 'DataTable', 'add order', samples, len(response.data))
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return git('rev-parse', '--short', 'HEAD') or None, bool(git('status', '--porcelain', '--untracked-files=no'))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(entry['size'], entry['page'], entry['name']): entry for entry in json.load(f)['results']}
+    print(f"\ncompared with {baseline_path} (median, > 1 is slower now)")
+    for entry in results:
+        before = baseline.get((entry['size'], entry['page'], entry['name']))
+        if before:
+            ratio = entry['median_ms'] / before['median_ms']
+            flag = '  <-- slower' if ratio > 1.2 else ''
+            print(f"{entry['size']:>10,}  {entry['page']:<10}{entry['name']:<30}{ratio:>8.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output')
+    parser.add_argument('--baseline')
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"callbacks-{commit or 'unknown'}.json")
+    client = app.server.test_client()
+    client.get('/')
+    dependencies = json.loads(client.get('/_dash-dependencies').data)
+
+    results = []
+    print(f"{'size':>10}  {'page':<10}{'step':<30}{'median (ms)':>12}{'min (ms)':>12}")
+    with tempfile.TemporaryDirectory(prefix='aldi-bench-') as store_dir:
+        for size in args.sizes:
+            dataset = load(size, os.path.join(store_dir, f'orders-{size}.db'), results)
+            bench_callbacks(size, dataset, client, dependencies, args.repeat, results)
+            # Let go of this size before generating the next
+            set_dataset(None)
+            del dataset
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit, 'dirty': dirty, 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(), 'pandas': pd.__version__, 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'repeat': args.repeat, 'results': results
+        }, f, indent=2)
+    print(f'\nwritten to {output}')
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
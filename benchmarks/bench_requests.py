@@ -0,0 +1,91 @@
+# Counts the callback requests a scripted browsing session sends to the server, against the count if every
+# callback ran server side (as the clientside ones in assets/clientside.js used to).
+# Run from the repository root: python benchmarks/bench_requests.py
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dash  # noqa: E402
+import app  # noqa: E402
+
+# ('load', page name) opens a page, anything else is one change of a component property
+SESSION = [
+    ('load', 'Graphs'),
+    'xaxis-dropdown.value', 'yaxis-dropdown.value', 'xaxis-dropdown.value', 'yaxis-dropdown.value',
+    'breakdown-dropdown.value', 'xaxis-dropdown.value',
+    ('load', 'DataTable'),
+    'open.n_clicks', 'close.n_clicks', 'open.n_clicks', 'close.n_clicks',
+    'open.n_clicks', 'button-add.n_clicks', 'alert-clear-interval.n_intervals',
+    'country-dropdown.value', 'state-dropdown.value'
+]
+
+
+def component_ids(layout):
+    layout = layout() if callable(layout) else layout
+    ids = {getattr(layout, 'id', None)}
+    ids.update(getattr(component, 'id', None) for component in layout._traverse())
+    return ids
+
+
+def dependencies():
+    # Without Dash's own page routing callbacks, which run the same either way
+    client = app.server.test_client()
+    client.get('/')
+    return [
+        dependency for dependency in json.loads(client.get('/_dash-dependencies').data)
+        if not all(output.startswith('_pages') for output in outputs_of(dependency))
+    ]
+
+
+def outputs_of(dependency):
+    output = dependency['output']
+    outputs = output.strip('.').split('...') if output.startswith('..') else [output]
+    return [item.split('@')[0] for item in outputs]
+
+
+def triggered_by(deps, prop):
+    # Callbacks a property change fires, following outputs on to the callbacks they feed.
+    fired, pending = [], [prop]
+    while pending:
+        changed = pending.pop()
+        for dependency in deps:
+            inputs = [f"{item['id']}.{item['property']}" for item in dependency['inputs']]
+            if changed in inputs and dependency not in fired:
+                fired.append(dependency)
+                pending.extend(outputs_of(dependency))
+    return fired
+
+
+def loaded(deps, page):
+    # Callbacks fired by the initial render of a page.
+    layout = next(entry['layout'] for entry in dash.page_registry.values() if entry['name'] == page)
+    ids = component_ids(app.app.layout) | component_ids(layout)
+    return [
+        dependency for dependency in deps
+        if not dependency.get('prevent_initial_call')
+        and all(item['id'] in ids for item in dependency['inputs'])
+        and all(output.rsplit('.', 1)[0] in ids for output in outputs_of(dependency))
+    ]
+
+
+def main():
+    deps = dependencies()
+    print(f"{'step':<36}{'callbacks':>10}{'server requests':>17}")
+    total_callbacks = total_requests = 0
+    for step in SESSION:
+        fired = loaded(deps, step[1]) if isinstance(step, tuple) else triggered_by(deps, step)
+        requests = [dependency for dependency in fired if not dependency.get('clientside_function')]
+        total_callbacks += len(fired)
+        total_requests += len(requests)
+        name = f'load {step[1]}' if isinstance(step, tuple) else step
+        print(f"{name:<36}{len(fired):>10}{len(requests):>17}")
+
+    print(f"{'session':<36}{total_callbacks:>10}{total_requests:>17}")
+    print(f"{total_callbacks - total_requests} of {total_callbacks} callbacks run in the browser, "
+          f"{1 - total_requests / total_callbacks:.0%} fewer server requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Times encoding the callback payloads (a DataTable page and every figure) to JSON, with plotly's json engine
+# (what Dash falls back to without orjson) and with the orjson engine on the plain figures the callbacks return.
+# Run from the repository root: python benchmarks/bench_serialization.py [--repeat N]
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: F401,E402  (registers the pages)
+from plotly.io.json import to_json_plotly  # noqa: E402
+from pages import graph, main as home, table  # noqa: E402
+from services.dataset import get_dataset  # noqa: E402
+
+
+def no_progress(value):
+    pass
+
+
+def payloads():
+    frame, _ = table.current_table()
+    yield 'table page (10 rows)', table.format_dates(frame.head(table.PAGE_SIZE)).to_dict('records')
+    yield 'table page (1000 rows)', table.format_dates(frame.head(1000)).to_dict('records')
+
+    cube = get_dataset().cube
+    year = cube.years[0]
+    monthly, products = home.update_monthly_charts(year)
+    yield 'home monthly', monthly
+    yield 'home top products', products
+    month = cube.months(year).index.max()
+    yield 'home daily trend', home.timeline_figure('Sales', year, month)
+    yield 'home orders', home.update_orders_chart(year, month)
+
+    for granularity in ['week', 'month']:
+        yield f'graphs timeline ({granularity})', graph.update_timeline_chart_v2(
+            no_progress, '2014-01-01', '2017-12-31', granularity
+        )
+    for breakdown in ['Segment', 'Customer Name', 'Product Name']:
+        yield f'graphs bubble ({breakdown})', graph.update_bubble_chart(
+            no_progress, breakdown, '2014-01-01', '2017-12-31', 'Profit', 'Sales'
+        )
+
+
+def best_of(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'payload':<30}{'bytes':>10}{'json (ms)':>12}{'orjson (ms)':>14}{'speedup':>10}")
+    for name, payload in payloads():
+        size = len(to_json_plotly(payload, engine='orjson'))
+        before = best_of(lambda: to_json_plotly(payload, engine='json'), args.repeat)
+        after = best_of(lambda: to_json_plotly(payload, engine='orjson'), args.repeat)
+        print(f"{name:<30}{size:>10,}{before:>12.2f}{after:>14.2f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Starts gunicorn (gunicorn.conf.py) with and without preloading the app in the master and, per worker count,
+# reports the memory of the workers and the DataTable callback throughput.
+# USS is what a worker holds alone, PSS splits the shared pages among the processes using them, so the
+# total PSS is the physical memory of the whole server.
+# Run from the repository root: python benchmarks/bench_workers.py [--workers 1 2 4] [--seconds N]
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MB = 1024 * 1024
+
+# One DataTable page: filtered, sorted and paged on the server, not memoized
+TABLE_REQUEST = {
+    'output': '..records-datatable.data...records-datatable.page_count...records-datatable.page_current..',
+    'outputs': [
+        {'id': 'records-datatable', 'property': 'data'},
+        {'id': 'records-datatable', 'property': 'page_count'},
+        {'id': 'records-datatable', 'property': 'page_current'}
+    ],
+    'inputs': [
+        {'id': 'country-dropdown', 'property': 'value', 'value': 'United States'},
+        {'id': 'state-dropdown', 'property': 'value', 'value': None},
+        {'id': 'city-dropdown', 'property': 'value', 'value': None},
+        {'id': 'records-datatable', 'property': 'page_current', 'value': 0},
+        {'id': 'records-datatable', 'property': 'page_size', 'value': 10},
+        {'id': 'records-datatable', 'property': 'sort_by', 'value': [{'column_id': 'Sales', 'direction': 'desc'}]},
+        # As the table sends it, with the case prefix on the operators
+        {'id': 'records-datatable', 'property': 'filter_query',
+         'value': '{Sales} s> 100 && {Product Name} scontains Chair'}
+    ],
+    'changedPropIds': ['records-datatable.filter_query']
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+
+
+def wait_until_warm(url, workers, timeout=300):
+    # Every worker has built all pages once enough responses in a row, from whichever worker, report so.
+    deadline, streak = time.monotonic() + timeout, 0
+    while streak < workers * 5:
+        if time.monotonic() > deadline:
+            raise TimeoutError(url)
+        try:
+            report = get(f'{url}/_startup')
+            streak = streak + 1 if None not in report.values() else 0
+        except OSError:
+            streak = 0
+        time.sleep(0.05)
+
+
+def memory(master):
+    workers = [process.memory_full_info() for process in master.children()]
+    total_pss = sum(info.pss for info in workers) + master.memory_full_info().pss
+    return sum(info.uss for info in workers) / len(workers), total_pss
+
+
+def throughput(url, seconds, clients):
+    body = json.dumps(TABLE_REQUEST).encode()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        count = 0
+        while time.monotonic() < deadline:
+            post(f'{url}/_dash-update-component', body)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(clients) as pool:
+        return sum(pool.map(lambda _: client(), range(clients))) / seconds
+
+
+def measure(workers, preload, seconds, store_dir):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(
+        os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers), PRELOAD='1' if preload else '0',
+        ORDER_STORE_PATH=os.path.join(store_dir, f'orders-{port}.db'),
+        BACKGROUND_CACHE_DIR=os.path.join(store_dir, f'background-{port}')
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:server'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_warm(url, workers)
+        uss, total_pss = memory(psutil.Process(server.pid))
+        return uss, total_pss, throughput(url, seconds, workers * 2)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    store_dir = tempfile.mkdtemp(prefix='aldi-workers-')
+    try:
+        print(f"{'mode':<10}{'workers':>8}{'USS / worker (MB)':>19}{'total PSS (MB)':>16}{'requests/s':>12}")
+        for preload in [False, True]:
+            for workers in args.workers:
+                uss, total_pss, rate = measure(workers, preload, args.seconds, store_dir)
+                mode = 'preload' if preload else 'per-worker'
+                print(f"{mode:<10}{workers:>8}{uss / MB:>19.1f}{total_pss / MB:>16.1f}{rate:>12.1f}")
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Bytes per Orders column as read from the workbook (dates formatted to text, as the DataTable page used to hold
+# them) against the typed schema the app keeps in memory.
+# Run from the repository root: python benchmarks/memory_report.py [--path data/sample.xlsx]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+from services.dataset import DATA_PATH, DATE_COLUMNS, apply_schema  # noqa: E402
+
+
+def column_bytes(frame):
+    return frame.memory_usage(deep=True, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default=DATA_PATH)
+    args = parser.parse_args()
+
+    raw = pd.read_excel(args.path, engine='openpyxl', sheet_name='Orders')
+    before = raw.copy()
+    for column in DATE_COLUMNS:
+        before[column] = pd.to_datetime(before[column]).dt.strftime('%Y-%m-%d')
+    after = apply_schema(raw)
+
+    sizes = pd.DataFrame({
+        'before': column_bytes(before),
+        'dtype before': before.dtypes.astype(str),
+        'after': column_bytes(after),
+        'dtype after': after.dtypes.astype(str)
+    })
+    sizes['ratio'] = sizes['before'] / sizes['after']
+
+    print(f"{len(raw)} order rows")
+    print(f"{'column':<16}{'dtype before':>16}{'bytes before':>14}{'dtype after':>16}{'bytes after':>13}{'ratio':>8}")
+    for column, row in sizes.iterrows():
+        print(f"{column:<16}{row['dtype before']:>16}{row['before']:>14,}{row['dtype after']:>16}"
+              f"{row['after']:>13,}{row['ratio']:>7.1f}x")
+    total_before, total_after = sizes['before'].sum(), sizes['after'].sum()
+    print(f"{'total':<16}{'':>16}{total_before:>14,}{'':>16}{total_after:>13,}{total_before / total_after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
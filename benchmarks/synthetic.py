@@ -0,0 +1,148 @@
+# Generates Orders / Returns sheets of any size with the workbook's columns and its statistics: every order
+# copies the date, shipping and location of a random sample order, and every line the quantity, discount,
+# price and margin of a random sample line, so the mix of values (and how they go together) stays realistic.
+# Customers and products grow with the size at the sample's rate (customers linearly, products with its
+# square root, a catalogue grows slower than its buyers), geography keeps the sample's cities.
+# Run from the repository root: python benchmarks/synthetic.py ROWS [--output data/synthetic.xlsx] [--seed N]
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dataset import read_sheets  # noqa: E402
+
+ORDER_COLUMNS = ['Order Date', 'Ship Date', 'Ship Mode', 'Country', 'City', 'State', 'Postal Code', 'Region']
+LINE_COLUMNS = ['Sales', 'Quantity', 'Discount', 'Profit']
+PRODUCT_COLUMNS = ['Product ID', 'Category', 'Sub-Category', 'Product Name']
+# Most rows an Excel sheet holds, the header included
+XLSX_MAX_ROWS = 1048576
+# Jitter of the copied order dates, so larger sizes do not pile up on the sample's days
+DATE_JITTER_DAYS = 3
+
+
+def _customers(sample, count, rng):
+    # count customers, named from the sample's first and last names, with the sample's share of segments.
+    names = sample['Customer Name'].astype(str).str.split(' ', n=1)
+    first = names.str[0].unique()
+    last = names.str[-1].unique()
+
+    index = np.arange(count)
+    name = pd.Series(first[index % len(first)]) + ' ' + pd.Series(last[(index // len(first)) % len(last)])
+    # Past every first / last name pair the names repeat with a number
+    round_ = index // (len(first) * len(last))
+    name = name.where(round_ == 0, name + ' ' + pd.Series(round_ + 1).astype(str))
+
+    initials = name.str[0] + name.str.split(' ').str[1].str[0]
+    segments = sample.drop_duplicates('Customer ID')['Segment'].astype(str)
+    return pd.DataFrame({
+        'Customer ID': initials + '-' + pd.Series(10000 + index).astype(str),
+        'Customer Name': name,
+        'Segment': rng.choice(segments.to_numpy(), count)
+    })
+
+
+def _products(sample, count, rng):
+    # count products: the sample's catalogue, then numbered variants of its products at a varied price.
+    catalogue = sample.drop_duplicates('Product ID')[PRODUCT_COLUMNS].astype(str).reset_index(drop=True)
+    base = np.arange(count) % len(catalogue)
+    variant = np.arange(count) // len(catalogue)
+
+    products = catalogue.iloc[base].reset_index(drop=True)
+    suffix = pd.Series(variant + 1).astype(str)
+    products['Product ID'] = products['Product ID'].where(variant == 0, products['Product ID'] + '-' + suffix)
+    products['Product Name'] = products['Product Name'].where(variant == 0, products['Product Name'] + ' #' + suffix)
+    products['Base'] = base
+    products['Price'] = np.where(variant == 0, 1.0, rng.lognormal(0, 0.1, count))
+    return products, catalogue
+
+
+def generate(rows, seed=0, customers=None, products=None):
+    # Orders and Returns sheets with about `rows` order lines, as read from the workbook.
+    rng = np.random.default_rng(seed)
+    sheets = read_sheets()
+    sample, sample_returns = sheets['Orders'], sheets['Returns']
+    scale = rows / len(sample)
+
+    customer_count = customers or max(int(sample['Customer ID'].nunique() * scale), 1)
+    product_count = products or max(int(sample['Product ID'].nunique() * max(scale, 1) ** 0.5), 1)
+    customer_table = _customers(sample, customer_count, rng)
+    product_table, catalogue = _products(sample, product_count, rng)
+
+    # Orders: lines per order drawn from the sample's distribution until there are enough lines
+    sample_orders = sample.drop_duplicates('Order ID').reset_index(drop=True)
+    lines_per_order = sample.groupby('Order ID').size().to_numpy()
+    order_count = int(np.ceil(rows / lines_per_order.mean() * 1.05))
+    lines = rng.choice(lines_per_order, order_count)
+    order_count = int(np.searchsorted(np.cumsum(lines), rows)) + 1
+    lines = lines[:order_count]
+    lines[-1] -= lines.sum() - rows
+
+    template = sample_orders.iloc[rng.integers(len(sample_orders), size=order_count)].reset_index(drop=True)
+    orders = template[ORDER_COLUMNS].copy()
+    jitter = pd.to_timedelta(rng.integers(-DATE_JITTER_DAYS, DATE_JITTER_DAYS + 1, order_count), unit='D')
+    first, last = sample['Order Date'].min(), sample['Order Date'].max()
+    orders['Order Date'] = (orders['Order Date'] + jitter).clip(first, last)
+    orders['Ship Date'] = orders['Order Date'] + (template['Ship Date'] - template['Order Date'])
+
+    year = orders['Order Date'].dt.year.astype(str)
+    ca_prefix = rng.random(order_count) < (sample_orders['Order ID'].str[:2] == 'CA').mean()
+    prefix = pd.Series(np.where(ca_prefix, 'CA', 'US'))
+    orders['Order ID'] = prefix + '-' + year + '-' + pd.Series(100000 + np.arange(order_count)).astype(str)
+    customer = customer_table.iloc[rng.integers(customer_count, size=order_count)].reset_index(drop=True)
+    orders = pd.concat([orders, customer], axis=1)
+
+    # Lines: the order's fields repeated, a product of the catalogue and a sample line of that product
+    frame = orders.iloc[np.repeat(np.arange(order_count), lines)].reset_index(drop=True)
+    product = product_table.iloc[rng.integers(product_count, size=rows)].reset_index(drop=True)
+    line = _sample_lines(sample, catalogue, product['Base'].to_numpy(), rng)
+    for column in PRODUCT_COLUMNS:
+        frame[column] = product[column]
+    for column in LINE_COLUMNS:
+        frame[column] = sample[column].to_numpy()[line]
+    frame['Sales'] = frame['Sales'] * product['Price']
+    frame['Profit'] = frame['Profit'] * product['Price']
+    frame.insert(0, 'Row ID', rng.permutation(rows) + 1)
+
+    returned = orders['Order ID'][rng.random(order_count) < sample_returns['Order ID'].nunique() / len(sample_orders)]
+    returns = pd.DataFrame({'Returned': 'Yes', 'Order ID': returned.to_numpy()})
+    return {'Orders': frame[sample.columns], 'Returns': returns[sample_returns.columns]}
+
+
+def _sample_lines(sample, catalogue, base, rng):
+    # A random sample line of each product, vectorized: products sorted by their lines, then an offset within.
+    codes = pd.Categorical(sample['Product ID'], categories=catalogue['Product ID']).codes
+    by_product = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(catalogue))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return by_product[starts[base] + (rng.random(len(base)) * counts[base]).astype(np.intp)]
+
+
+def write_workbook(sheets, path):
+    # A workbook the app can load with DATA_PATH=path.
+    if len(sheets['Orders']) >= XLSX_MAX_ROWS:
+        raise ValueError(f"{len(sheets['Orders'])} rows do not fit an Excel sheet")
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--output', default='data/synthetic.xlsx')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--customers', type=int)
+    parser.add_argument('--products', type=int)
+    args = parser.parse_args()
+
+    sheets = generate(args.rows, args.seed, args.customers, args.products)
+    write_workbook(sheets, args.output)
+    print(f"{args.output}: {len(sheets['Orders'])} order lines, {len(sheets['Returns'])} returned orders")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 import dash_bootstrap_components as dbc
 from dash import html
+from services.assets import asset_url
 
 
 def create_sidebar():
-    logo_url = "assets/Aldi_Süd_2017_logo.svg"
+    logo_url = asset_url("Aldi_Süd_2017_logo.svg")
     return dbc.Nav(
         [
             dbc.Row([
@@ -0,0 +1,45 @@
+# Production settings: gunicorn -c gunicorn.conf.py app:server
+# The app is imported once in the master, which also builds the dataset and every page's data, and the
+# workers are forked from it. They share those frames copy-on-write instead of each loading its own copy,
+# so another worker adds little more than its own interpreter state. PRELOAD=0 goes back to importing per worker.
+import gc
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get('BIND', '0.0.0.0:80')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+timeout = int(os.environ.get('TIMEOUT', 30))
+preload_app = os.environ.get('PRELOAD', '1') != '0'
+
+# Workers and background callback processes write their metrics here, /metrics sums them (services/metrics.py)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'aldi-metrics'))
+
+if preload_app:
+    # The master builds everything itself before forking, a warmup thread would be lost (or hold a lock) at fork
+    os.environ['WARMUP'] = 'off'
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded import, before any worker is forked.
+    if not preload_app:
+        return
+    from services.lazy import startup_report, warm_up
+    warm_up()
+    server.log.info('Page data built in the master: %s', startup_report())
+
+    # Park everything allocated so far in the permanent generation: the collector then never walks those objects
+    # in the workers, and writing their GC headers would copy the shared pages one by one.
+    gc.collect()
+    gc.freeze()
@@ -1,52 +1,55 @@
 import dash
-from dash import dcc, html, callback, Output, Input
+from dash import dcc, html, callback, clientside_callback, ClientsideFunction, ctx, Output, Input, State, Patch
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 from datetime import date
 from dash.exceptions import PreventUpdate
+from services.cache import cached
+from services.dataset import get_dataset
+from services.lazy import Lazy
+from services.metrics import instrument, lap
+from services.serialization import to_plain
+from services.traces import line, scatter
 
 dash.register_page(__name__, name='Graphs')
 
-orders_df = pd.read_excel('data/sample.xlsx', engine='openpyxl', sheet_name='Orders')
-returns_df = pd.read_excel('data/sample.xlsx', engine='openpyxl', sheet_name='Returns')
+# The page's aggregates are built on its first visit, or ahead of it by the warmup
+warm = Lazy(lambda: (get_dataset().daily_stats, get_dataset().breakdowns), name='Graphs')
 
-orders_df['Days to Ship'] = (orders_df['Ship Date'] - orders_df['Order Date']).dt.days
-df_merged = pd.merge(orders_df, returns_df, on='Order ID', how='left')
+# Leaving the page cancels the background figure jobs still running for it; changing an input
+# mid-computation already terminates the stale job, the renderer sends it along as oldJob
+cancel_on_leave = [Input('_pages_location', 'pathname')]
 
-# Pre-set start date and end date
-start_date, end_date = '1/1/2017', '12/31/2017'
 
-
-def filter_by_date(df, start_d, end_d):
-    filtered_orders = df[(df['Order Date'] >= start_d) & (df['Order Date'] <= end_d)]
-    return filtered_orders
-
-
-def filter_by_granularity(df, granularity_option):
+def filter_by_granularity(daily, granularity_option):
+    # Roll the per-day partials up to the chosen period; sums add up and means are sum / count.
+    days = daily.index
 
     if granularity_option == 'week':
-        group_keys = [df['Order Date'].dt.year, df['Order Date'].dt.isocalendar().week]
+        group_keys = [days.year, days.isocalendar().week.to_numpy()]
     elif granularity_option == 'month':
-        group_keys = [df['Order Date'].dt.year, df['Order Date'].dt.month]
+        group_keys = [days.year, days.month]
     elif granularity_option == 'quarter':
-        group_keys = [df['Order Date'].dt.year, df['Order Date'].dt.quarter]
+        group_keys = [days.year, days.quarter]
     elif granularity_option == 'year':
-        group_keys = [df['Order Date'].dt.year]
+        group_keys = [days.year]
     else:
-        return df
-
-    grouped = df.groupby(group_keys).agg(
-        Date=('Order Date', 'min'),
-        Days_to_Ship=('Days to Ship', 'mean'),
-        Discount=('Discount', 'mean'),
-        Profit=('Profit', 'sum'),
-        Quantity=('Quantity', 'sum'),
-        Sales=('Sales', 'sum'),
-        Returned=('Returned', lambda x: (x == 'Yes').sum()),
-        Ship_mode=('Ship Mode', 'count')
-    )
+        return daily
+
+    periods = daily.groupby(group_keys)
+    totals = periods.sum()
+    grouped = pd.DataFrame({
+        'Date': pd.Series(days, index=days).groupby(group_keys).min(),
+        'Days_to_Ship': totals['Days to Ship Sum'] / totals['Days to Ship Count'],
+        'Discount': totals['Discount Sum'] / totals['Discount Count'],
+        'Profit': totals['Profit'],
+        'Quantity': totals['Quantity'],
+        'Sales': totals['Sales'],
+        'Returned': totals['Returned'],
+        'Ship_mode': totals['Ship Mode Count']
+    })
     grouped['Profit Ratio'] = grouped['Profit'] / grouped['Sales']
 
     if granularity_option == 'week':
@@ -56,28 +59,27 @@ def filter_by_granularity(df, granularity_option):
     return grouped
 
 
-def get_bubble_chart_data(df, yaxis, xaxis, category):
-
-    grouped_df = df.groupby(category).agg({
-        'Row ID': 'count',
-        'Sales': 'sum',
-        'Profit': 'sum',
-        'Discount': 'mean',
-        'Quantity': 'sum',
-        'Days to Ship': 'mean',
-        'Returned': lambda x: (x == 'Yes').sum()
-    }).reset_index()
-
+def summarize_breakdown(totals, category):
+    # All bubble chart metrics per category value from its summed partials; the axes only pick two of them.
+    grouped_df = pd.DataFrame({
+        'Row ID': totals['Count'],
+        'Sales': totals['Sales'],
+        'Profit': totals['Profit'],
+        'Discount': totals['Discount Sum'] / totals['Discount Count'] * 100,
+        'Quantity': totals['Quantity'],
+        'Days to Ship': totals['Days to Ship Sum'] / totals['Days to Ship Count'],
+        'Returned': totals['Returned']
+    })
     grouped_df['Profit Ratio'] = (grouped_df['Profit'] / grouped_df['Sales']) * 100
-    grouped_df['Discount'] = grouped_df['Discount'] * 100 
 
     if category != 'Product Name' and category != 'Sub-Category' and category != 'Category':
-        unique_retuns = df.drop_duplicates(subset='Order ID').groupby(category).agg({
-            'Returned': lambda x: (x == 'Yes').sum()
-        }).reset_index()
+        # Count each returned order once
+        grouped_df['Returned'] = totals['Orders Returned']
 
-        grouped_df['Returned'] = unique_retuns['Returned']
-    
+    return grouped_df.reset_index()
+
+
+def get_bubble_chart_data(grouped_df, yaxis, xaxis, category):
     return pd.DataFrame({
         xaxis: grouped_df[xaxis].tolist(),
         yaxis: grouped_df[yaxis].tolist(),
@@ -144,6 +146,7 @@ layout = html.Div(
             dbc.Col(
                 [   
                     html.Div([
+                        dbc.Progress(id='timeline-progress', value=0, style={'height': '4px'}),
                         dcc.Graph(
                             id='timeline-graph',
                         )
@@ -200,6 +203,8 @@ layout = html.Div(
                             ),
                         ], xs=12, sm=12, md=3, lg=3, xl=3, xxl=3, align="center")
                     ], className="pt-3", justify="end"),
+                    dcc.Store(id='axis-options', data=axis_options),
+                    dbc.Progress(id='bubblechart-progress', value=0, style={'height': '4px'}),
                     dcc.Graph(
                         id='bubblechart'
                     )
@@ -210,40 +215,30 @@ layout = html.Div(
 )
 
 
-@callback(
+# Each axis dropdown offers every option except the one picked on the other axis (assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='filter_axis_options'),
     Output('yaxis-dropdown', 'options'),
-    Input('xaxis-dropdown', 'value')
+    Input('xaxis-dropdown', 'value'),
+    State('axis-options', 'data')
 )
-def set_yaxis_options(selected_xaxis):
-    return [option for option in axis_options if option['value'] != selected_xaxis]
-
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='filter_axis_options'),
     Output('xaxis-dropdown', 'options'),
-    Input('yaxis-dropdown', 'value')
+    Input('yaxis-dropdown', 'value'),
+    State('axis-options', 'data')
 )
-def set_xaxis_options(selected_yaxis):
-    return [option for option in axis_options if option['value'] != selected_yaxis]
 
 
-@callback(
-    Output('bubblechart', 'figure'),
-    [
-        Input('xaxis-dropdown', 'value'),
-        Input('yaxis-dropdown', 'value'),
-        Input('breakdown-dropdown', 'value'),
-        Input('start-date', 'date'),
-        Input('end-date', 'date')
-    ]
-)
-def update_bubble_chart(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
-    if start_d is None or end_d is None or xaxis_val is None or yaxis_val is None or breakdown_val is None:
-        raise PreventUpdate
+def bubble_totals(breakdown_val, start_d, end_d):
+    # The summarized breakdown, kept for the axis switches that plot other columns of it.
+    return cached('bubble-totals', (breakdown_val, start_d, end_d), lambda: summarize_breakdown(
+        get_dataset().breakdowns.between(breakdown_val, start_d, end_d), breakdown_val
+    ))
 
-    filter_date = filter_by_date(df_merged, start_d, end_d)
-    df_filtered = get_bubble_chart_data(filter_date, xaxis_val, yaxis_val, breakdown_val)
 
-    # hover config
+def bubble_hovertemplate(xaxis_val, yaxis_val):
     x_format = '%{x:.0f}'
     if xaxis_val == 'Profit' or xaxis_val == 'Sales':
         x_format = '$%{x:,.0f}'
@@ -256,11 +251,53 @@ def update_bubble_chart(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
     elif yaxis_val == 'Profit Ratio' or yaxis_val == 'Discount':
         y_format = '%{y:.2f}%'
 
+    return (
+        f"<b>%{{customdata}}: %{{text}}"
+        f"<br><br>{xaxis_val}: {x_format}"
+        f"<br>{yaxis_val}: {y_format}<br>"
+    )
+
+
+# The breakdown and the date range rebuild the chart in the background; the axes are only read here and
+# can't change while that runs. Switching an axis afterwards patches the figure (switch_bubble_axis).
+@callback(
+    Output('bubblechart', 'figure'),
+    [
+        Input('breakdown-dropdown', 'value'),
+        Input('start-date', 'date'),
+        Input('end-date', 'date')
+    ],
+    [
+        State('xaxis-dropdown', 'value'),
+        State('yaxis-dropdown', 'value')
+    ],
+    background=True,
+    running=[
+        (Output('bubblechart', 'style'), {'opacity': 0.5}, {'opacity': 1}),
+        (Output('xaxis-dropdown', 'disabled'), True, False),
+        (Output('yaxis-dropdown', 'disabled'), True, False)
+    ],
+    progress=[Output('bubblechart-progress', 'value')],
+    progress_default=[0],
+    cancel=cancel_on_leave,
+    interval=500
+)
+@instrument
+def update_bubble_chart(set_progress, breakdown_val, start_d, end_d, xaxis_val, yaxis_val):
+    if start_d is None or end_d is None or xaxis_val is None or yaxis_val is None or breakdown_val is None:
+        raise PreventUpdate
+
+    set_progress(10)
+    grouped_df = bubble_totals(breakdown_val, start_d, end_d)
+    set_progress(70)
+    df_filtered = get_bubble_chart_data(grouped_df, xaxis_val, yaxis_val, breakdown_val)
+    lap('data')
+
     fig = {
         'data': [
-            go.Scatter(
-                x=df_filtered[xaxis_val],
-                y=df_filtered[yaxis_val],
+            scatter(
+                df_filtered[xaxis_val],
+                df_filtered[yaxis_val],
                 mode='markers',
                 marker=dict(
                     size=df_filtered[f'{breakdown_val} Count'],
@@ -269,10 +306,7 @@ def update_bubble_chart(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
                 ),
                 text=df_filtered[f'{breakdown_val} Count'],
                 customdata=df_filtered[breakdown_val],
-                hovertemplate=f""
-                              f"<b>%{{customdata}}: %{{text}}"
-                              f"<br><br>{xaxis_val}: {x_format}"
-                              f"<br>{yaxis_val}: {y_format}<br>"
+                hovertemplate=bubble_hovertemplate(xaxis_val, yaxis_val)
             )
         ],
         'layout': go.Layout(
@@ -281,7 +315,40 @@ def update_bubble_chart(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
             height=520
         )
     }
-    return fig
+    set_progress(100)
+    return to_plain(fig)
+
+
+# An axis switch keeps the bubbles, their sizes and labels, and sends only the other column, the axis
+# title and the hover text as a patch of the figure in the browser.
+@callback(
+    Output('bubblechart', 'figure', allow_duplicate=True),
+    [
+        Input('xaxis-dropdown', 'value'),
+        Input('yaxis-dropdown', 'value')
+    ],
+    [
+        State('breakdown-dropdown', 'value'),
+        State('start-date', 'date'),
+        State('end-date', 'date')
+    ],
+    prevent_initial_call=True
+)
+@instrument
+def switch_bubble_axis(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
+    if start_d is None or end_d is None or xaxis_val is None or yaxis_val is None or breakdown_val is None:
+        raise PreventUpdate
+
+    grouped_df = bubble_totals(breakdown_val, start_d, end_d)
+    lap('data')
+
+    patch = Patch()
+    for axis, value in [('x', xaxis_val), ('y', yaxis_val)]:
+        if f'{axis}axis-dropdown.value' in ctx.triggered_prop_ids:
+            patch['data'][0][axis] = grouped_df[value].tolist()
+            patch['layout'][f'{axis}axis']['title']['text'] = value
+    patch['data'][0]['hovertemplate'] = bubble_hovertemplate(xaxis_val, yaxis_val)
+    return patch
 
 
 @callback(
@@ -290,14 +357,27 @@ def update_bubble_chart(xaxis_val, yaxis_val, breakdown_val, start_d, end_d):
         Input('start-date', 'date'),
         Input('end-date', 'date'),
         Input('granularity-dropdown', 'value')
-    ]
+    ],
+    background=True,
+    running=[(Output('timeline-graph', 'style'), {'opacity': 0.5}, {'opacity': 1})],
+    progress=[Output('timeline-progress', 'value')],
+    progress_default=[0],
+    cancel=cancel_on_leave,
+    interval=500
 )
-def update_timeline_chart_v2(start_d, end_d, granularity):
+@instrument
+def update_timeline_chart_v2(set_progress, start_d, end_d, granularity):
     if start_d is None or end_d is None or granularity is None:
         raise PreventUpdate
 
-    filter_date = filter_by_date(df_merged, start_d, end_d)
-    updated_df = filter_by_granularity(filter_date, granularity)
+    set_progress(10)
+    daily = get_dataset().daily_stats.between(start_d, end_d)
+    updated_df = filter_by_granularity(daily, granularity)
+    set_progress(40)
+    lap('data')
+
+    # datetime64 rather than a Series, which plotly would turn into an array of datetime objects
+    dates = updated_df['Date'].to_numpy()
 
     mode = 'lines'
     if len(updated_df) == 1:
@@ -311,7 +391,7 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
     # Top left subplot with Profit and sales
     fig.add_trace(
         go.Bar(
-            x=updated_df['Date'],
+            x=dates,
             y=updated_df['Profit'],
             name='Profit',
             marker=dict(color='#e6221b'),
@@ -322,7 +402,7 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
     )
     fig.add_trace(
         go.Bar(
-            x=updated_df['Date'],
+            x=dates,
             y=updated_df['Sales'],
             name='Sales',
             marker=dict(color='#4c7a9c'),
@@ -334,9 +414,9 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
 
     # top right subplot with Discount and Profit Ratio
     fig.add_trace(
-        go.Scatter(
-            x=updated_df['Date'],
-            y=updated_df['Discount'],
+        line(
+            dates,
+            updated_df['Discount'],
             name='Discount',
             mode=mode,
             marker=dict(color='#e6221b')
@@ -345,9 +425,9 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
         col=2
     )
     fig.add_trace(
-        go.Scatter(
-            x=updated_df['Date'],
-            y=updated_df['Profit Ratio'],
+        line(
+            dates,
+            updated_df['Profit Ratio'],
             name='Profit Ratio',
             mode=mode,
             marker=dict(color='#4c7a9c')
@@ -359,7 +439,7 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
     # bottom left subplot with Returned & Quantity
     fig.add_trace(
         go.Bar(
-            x=updated_df['Date'],
+            x=dates,
             y=updated_df['Returned'],
             name='Returns',
             marker=dict(color='#e6221b'),
@@ -370,7 +450,7 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
     )
     fig.add_trace(
         go.Bar(
-            x=updated_df['Date'],
+            x=dates,
             y=updated_df['Quantity'],
             name='Quantity',
             marker=dict(color='#4c7a9c'),
@@ -382,9 +462,9 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
 
     # Bottom right subplot with Days to ship
     fig.add_trace(
-        go.Scatter(
-            x=updated_df['Date'],
-            y=updated_df['Days_to_Ship'],
+        line(
+            dates,
+            updated_df['Days_to_Ship'],
             name='Days to Ship',
             mode=mode,
             marker=dict(color='#e6221b'),
@@ -408,7 +488,8 @@ def update_timeline_chart_v2(start_d, end_d, granularity):
 
     fig.update_xaxes(gridcolor='#EEEEEE')
     fig.update_yaxes(gridcolor='#EEEEEE')
-    return fig
+    set_progress(100)
+    return to_plain(fig)
 
 # version 1 
 # @callback(
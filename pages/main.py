@@ -1,45 +1,36 @@
 import dash
-from dash import dcc, html, callback, Output, Input
-import pandas as pd
+from dash import dcc, html, callback, ctx, Output, Input, Patch
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
 import calendar
 from components.card import create_card
+from services.cache import memoize
+from services.dataset import get_dataset
+from services.lazy import Lazy
+from services.metrics import instrument, lap
+from services.serialization import to_plain
+from services.traces import line
 
 dash.register_page(__name__, path='/', name='Home')
 
-df = pd.read_excel('data/sample.xlsx', engine='openpyxl', sheet_name='Orders')
-unique_years = sorted(df['Order Date'].dt.year.unique(), reverse=True)
-latest_year = unique_years[0]
-latest_year_df = df[df['Order Date'].dt.year == latest_year]
-latest_month = latest_year_df['Order Date'].dt.month.max()
+# The page's aggregates are built on its first visit, or ahead of it by the warmup
+warm = Lazy(lambda: get_dataset().cube, name='Home')
 
-def summarize_sales_data(dataframe, year):
-    # Summarizes sales data for a given year.
-    df_year = dataframe[dataframe['Order Date'].dt.year == year].copy()
-    df_year['Month'] = df_year['Order Date'].dt.month
 
-    # Group by Month for Sales and Profit Summary
-    grouped_sales = df_year.groupby('Month')[['Sales', 'Profit']].sum().reset_index()
+def summarize_sales_data(time_cube, year):
+    # Summarizes sales data for a given year.
+    grouped_sales = time_cube.months(year)[['Sales', 'Profit']].reset_index()
     grouped_sales['Month Name'] = grouped_sales['Month'].apply(lambda x: calendar.month_name[x])
     grouped_sales['Profit Ratio'] = grouped_sales['Profit'] / grouped_sales['Sales']
 
-    # Group by Product for Quantity Summary
-    grouped_products = df_year.groupby(['Product ID', 'Product Name'])['Quantity'].sum().reset_index()
-    top_10_products = grouped_products.sort_values(by='Quantity', ascending=False).head(10)
-    
+    top_10_products = time_cube.top_products(year, 10)
+
     return grouped_sales, top_10_products
 
 
-def aggregate_sales_data(dataframe, year, month):
+def aggregate_sales_data(time_cube, year, month):
     # Aggregate sales data for a given year and month.
-
-    df_filtered = dataframe[(dataframe['Order Date'].dt.year == year) & (dataframe['Order Date'].dt.month == month)]
-    grouped_df = df_filtered.groupby('Order Date').agg({
-        'Sales': 'sum',
-        'Profit': 'sum',
-        'Order Date': 'count'
-    }).rename(columns={'Order Date': 'Count'}).reset_index()
+    grouped_df = time_cube.days(year, month)[['Sales', 'Profit', 'Count']].reset_index()
 
     grouped_df['Profit Ratio'] = grouped_df['Profit'] / grouped_df['Sales']
     grouped_df['Day'] = grouped_df['Order Date'].dt.day
@@ -47,74 +38,77 @@ def aggregate_sales_data(dataframe, year, month):
     return grouped_df
 
 
-# Generate options for a month and year component
-year_options = [{'label': year, 'value': year} for year in unique_years]
+# Generate options for a month component
 month_options = [{'label': month, 'value': str(index)} for index, month in enumerate(calendar.month_name) if month]
 
-layout = html.Div([
-    dbc.Row([
-        dbc.Col([
-            dbc.Select(
-                    id='year-selector',
-                    options=year_options,
-                    value=2017
-                ),
-        ], xs=12, sm=12, md=12, lg=6, xl=2, xxl=2, className="p-2"),
-        dbc.Col([
-            dbc.Select(
-                    id='month-selector',
-                    options=month_options,
-                    value=12
-                ),
-        ], xs=12, sm=12, md=12, lg=6, xl=2, xxl=2, className="p-2")
-    ], className="justify-content-end pb-2"),
-
-    dbc.Row([
-        dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="sales-col"),
-        dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="profit-col"),
-        dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="profit-ratio-col"),
-    ]),
-
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(
-                id='monthly-chart'
-            )
-        ], xs=12, sm=12, md=12, lg=6, xl=8, xxl=8, className="p-2"),
-        dbc.Col([
-            dcc.Graph(
-                id='sold-products-chart'
-            )
-        ], xs=12, sm=12, md=12, lg=6, xl=4, xxl=4, className="p-2")
-    ], className='py-2'),
-
-    dbc.Row([
-        dbc.Col([
-            dbc.Select(
-                id='property-selector',
-                options=[
-                    {'label': 'Profit', 'value': 'Profit'},
-                    {'label': 'Sales', 'value': 'Sales'},
-                    {'label': 'Profit Ratio', 'value': 'Profit Ratio'}
-                ],
-                value='Profit Ratio'
-            )
-        ], className="property-dropdown")
-    ], className="compare-months"),
 
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(
-                id='timeline-chart'
-            )
-        ], xs=12, sm=12, md=12, lg=6, xl=8, xxl=8, className="p-2"),
-        dbc.Col([
-            dcc.Graph(
-                id='orders-chart'
-            )
-        ], xs=12, sm=12, md=12, lg=6, xl=4, xxl=4, className="p-2")
-    ], className='py-2'),
-], className="px-3")
+def layout():
+    # A function, so the years are only read once the page is visited
+    year_options = [{'label': year, 'value': year} for year in get_dataset().cube.years]
+    return html.Div([
+        dbc.Row([
+            dbc.Col([
+                dbc.Select(
+                        id='year-selector',
+                        options=year_options,
+                        value=2017
+                    ),
+            ], xs=12, sm=12, md=12, lg=6, xl=2, xxl=2, className="p-2"),
+            dbc.Col([
+                dbc.Select(
+                        id='month-selector',
+                        options=month_options,
+                        value=12
+                    ),
+            ], xs=12, sm=12, md=12, lg=6, xl=2, xxl=2, className="p-2")
+        ], className="justify-content-end pb-2"),
+
+        dbc.Row([
+            dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="sales-col"),
+            dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="profit-col"),
+            dbc.Col([], xs=12, sm=12, md=4, lg=4, xl=4, xxl=4, id="profit-ratio-col"),
+        ]),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(
+                    id='monthly-chart'
+                )
+            ], xs=12, sm=12, md=12, lg=6, xl=8, xxl=8, className="p-2"),
+            dbc.Col([
+                dcc.Graph(
+                    id='sold-products-chart'
+                )
+            ], xs=12, sm=12, md=12, lg=6, xl=4, xxl=4, className="p-2")
+        ], className='py-2'),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Select(
+                    id='property-selector',
+                    options=[
+                        {'label': 'Profit', 'value': 'Profit'},
+                        {'label': 'Sales', 'value': 'Sales'},
+                        {'label': 'Profit Ratio', 'value': 'Profit Ratio'}
+                    ],
+                    value='Profit Ratio'
+                )
+            ], className="property-dropdown")
+        ], className="compare-months"),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(
+                    id='timeline-chart'
+                )
+            ], xs=12, sm=12, md=12, lg=6, xl=8, xxl=8, className="p-2"),
+            dbc.Col([
+                dcc.Graph(
+                    id='orders-chart'
+                )
+            ], xs=12, sm=12, md=12, lg=6, xl=4, xxl=4, className="p-2")
+        ], className='py-2'),
+    ], className="px-3")
 
 
 @callback(
@@ -126,21 +120,24 @@ layout = html.Div([
     Input('year-selector', 'value')
 
 )
+@instrument
+@memoize()
 def update_cards(year_selected):
-    grouped_sales_df, top_10_products = summarize_sales_data(df, int(year_selected))
+    totals = get_dataset().cube.year_totals(int(year_selected))
+    lap('data')
     sales_card = create_card(
         "fa-solid fa-sack-dollar",
         "Total Sales",
-        f"{round(grouped_sales_df['Sales'].sum(), 2):,.0f}$"
+        f"{round(totals['Sales'], 2):,.0f}$"
     )
 
     profit_card = create_card(
         "fa-solid fa-hand-holding-dollar",
         "Total Profit",
-        f"{round(grouped_sales_df['Profit'].sum(), 2):,.0f}$"
+        f"{round(totals['Profit'], 2):,.0f}$"
     )
 
-    profit_ratio = round(grouped_sales_df['Profit'].sum() / grouped_sales_df['Sales'].sum(), 3) * 100
+    profit_ratio = round(totals['Profit'] / totals['Sales'], 3) * 100
     profit_ratio_card = create_card(
         "fa-solid fa-piggy-bank",
         "Profit Ratio",
@@ -159,9 +156,12 @@ def update_cards(year_selected):
         Input('year-selector', 'value'),
     ]
 )
+@instrument
+@memoize()
 def update_monthly_charts(year_selected):
     # most recent year is selected initially
-    grouped_sales_df, top_10_products = summarize_sales_data(df, int(year_selected))
+    grouped_sales_df, top_10_products = summarize_sales_data(get_dataset().cube, int(year_selected))
+    lap('data')
 
     monthly_figure = {
         'data': [
@@ -217,31 +217,21 @@ def update_monthly_charts(year_selected):
             height=450
         )
     }
-    return monthly_figure, products_figure
+    return to_plain(monthly_figure), to_plain(products_figure)
 
 
-@callback(
-    [
-        Output('timeline-chart', 'figure'),
-        Output('orders-chart', 'figure')
-    ],
-    [
-        Input('property-selector', 'value'),
-        Input('year-selector', 'value'),
-        Input('month-selector', 'value')
-    ]
-)
-def update_timeline_chart(property_selected, year_selected, month_selected):
-    
-    grouped_current_month_df = aggregate_sales_data(df, int(year_selected), int(month_selected))
+def month_before(year, month):
+    return (year, month - 1) if month > 1 else (year - 1, 12)
+
 
-    prev_month = int(month_selected) - 1
-    prev_month_year = int(year_selected)
-    if prev_month == 0:
-        prev_month = 12
-        prev_month_year -= 1
+@memoize()
+def timeline_figure(property_selected, year_selected, month_selected):
+    year, month = int(year_selected), int(month_selected)
+    prev_month_year, prev_month = month_before(year, month)
 
-    grouped_prev_month_df = aggregate_sales_data(df, prev_month_year, prev_month)
+    grouped_current_month_df = aggregate_sales_data(get_dataset().cube, year, month)
+    grouped_prev_month_df = aggregate_sales_data(get_dataset().cube, prev_month_year, prev_month)
+    lap('data')
 
     yaxis = {
         "title": property_selected
@@ -251,21 +241,21 @@ def update_timeline_chart(property_selected, year_selected, month_selected):
 
     revenue_fig = {
         'data': [
-            go.Scatter(
-                x=grouped_prev_month_df['Order Date'],
-                y=grouped_prev_month_df[property_selected],
+            line(
+                grouped_prev_month_df['Order Date'].to_numpy(),
+                grouped_prev_month_df[property_selected],
                 mode='lines+markers',
                 marker=dict(color='#B5C0D0'),
                 hovertemplate=f"<br>%{{x}}<br>{property_selected} : %{{y}}",
                 name=f'{calendar.month_name[prev_month]}, {prev_month_year}'
             ),
-            go.Scatter(
-                x=grouped_current_month_df['Order Date'],
-                y=grouped_current_month_df[property_selected],
+            line(
+                grouped_current_month_df['Order Date'].to_numpy(),
+                grouped_current_month_df[property_selected],
                 mode='lines+markers',
                 marker=dict(color='#40679E'),
                 hovertemplate=f"<br>%{{x}}<br>{property_selected} : %{{y}}",
-                name=f'{calendar.month_name[int(month_selected)]}, {year_selected}'
+                name=f'{calendar.month_name[month]}, {year_selected}'
             )
         ],
         'layout': go.Layout(
@@ -276,11 +266,51 @@ def update_timeline_chart(property_selected, year_selected, month_selected):
         )
     }
 
+    return to_plain(revenue_fig)
+
+
+@callback(
+    Output('timeline-chart', 'figure'),
+    [
+        Input('property-selector', 'value'),
+        Input('year-selector', 'value'),
+        Input('month-selector', 'value')
+    ]
+)
+@instrument
+def update_timeline_chart(property_selected, year_selected, month_selected):
+    figure = timeline_figure(property_selected, year_selected, month_selected)
+    if set(ctx.triggered_prop_ids) != {'property-selector.value'}:
+        return figure
+
+    # Only the property changed: the browser keeps its figure and gets the new y values, hover text and axis.
+    # The days (x) stay, a month's daily points are never downsampled.
+    patch = Patch()
+    for index, trace in enumerate(figure['data']):
+        patch['data'][index]['y'] = trace['y']
+        patch['data'][index]['hovertemplate'] = trace['hovertemplate']
+    patch['layout']['yaxis'] = figure['layout']['yaxis']
+    return patch
+
+
+@callback(
+    Output('orders-chart', 'figure'),
+    [
+        Input('year-selector', 'value'),
+        Input('month-selector', 'value')
+    ]
+)
+@instrument
+@memoize()
+def update_orders_chart(year_selected, month_selected):
+    grouped_current_month_df = aggregate_sales_data(get_dataset().cube, int(year_selected), int(month_selected))
+    lap('data')
+
     orders_fig = {
         'data': [
-            go.Scatter(
-                x=grouped_current_month_df['Order Date'],
-                y=grouped_current_month_df['Count'],
+            line(
+                grouped_current_month_df['Order Date'].to_numpy(),
+                grouped_current_month_df['Count'],
                 mode='lines',
                 marker=dict(color='#40679E'),
                 name='Past 30 Days'
@@ -294,4 +324,4 @@ def update_timeline_chart(property_selected, year_selected, month_selected):
         )
     }
 
-    return revenue_fig, orders_fig
+    return to_plain(orders_fig)
@@ -1,137 +1,173 @@
+import math
 import dash
-from dash import dcc, html, dash_table, callback, Output, Input, State
-import pandas as pd
+import numpy as np
+from dash import dcc, html, dash_table, callback, clientside_callback, ClientsideFunction, Output, Input, State
 import dash_bootstrap_components as dbc
 from datetime import datetime
+from services.dataset import get_dataset
+from services.lazy import Lazy
+from services.metrics import instrument
+from services.order_store import DuplicateOrderError
+from services.table_query import DATE_FORMAT, filter_mask, select_page
 
 dash.register_page(__name__, name='DataTable')
 
-df = pd.read_excel('data/sample.xlsx', engine='openpyxl', sheet_name='Orders')
-
-df['Order Date'] = df['Order Date'].dt.strftime('%Y-%m-%d')
-df['Ship Date'] = df['Ship Date'].dt.strftime('%Y-%m-%d')
-
-# get countries for country dropdown
-unique_countries = df['Country'].unique()
-country_options = [{'label': country, 'value': country} for country in unique_countries]
-
-layout = html.Div(
-    [   
-        dbc.Row([
-            # page title
-            dbc.Col([
-                html.H3("Orders History"),
-            ], xs=6, sm=6, md=6, lg=6, xl=6, xxl=6, align="center"),
-
-            # add order button
-            dbc.Col([
-                dbc.Button([
-                    html.I(className="fa-solid fa-plus"),
-                    " Add Order"
-                ], id='open', n_clicks=0)
-            ], xs=6, sm=6, md=6, lg=6, xl=6, xxl=6, className="d-flex justify-content-end"),
-        ], className="py-4", align="start"),
+
+def format_dates(frame):
+    # The table keeps native dates; only the rows sent to the browser are formatted.
+    frame = frame.copy(deep=False)
+    frame['Order Date'] = frame['Order Date'].dt.strftime(DATE_FORMAT)
+    frame['Ship Date'] = frame['Ship Date'].dt.strftime(DATE_FORMAT)
+    return frame
+
+
+PAGE_SIZE = 10
+
+
+def current_table():
+    # The table rows and their sort index of the dataset this request is pinned to.
+    return get_dataset().table
+
+
+def warm_table():
+    # Everything the first render needs: the rows, their default sort order and the location index.
+    table, sort_index = current_table()
+    sort_index.order('Order Date', False)
+    return get_dataset().geo
+
+
+# The page's data is built on its first visit, or ahead of it by the warmup
+warm = Lazy(warm_table, name='DataTable')
+
+
+def layout():
+    # A function, so the orders are only read once the page is visited
+    dataset = get_dataset()
+    # get countries for country dropdown
+    country_options = [{'label': country, 'value': country} for country in dataset.geo.countries]
+    return html.Div(
+        [   
+            dbc.Row([
+                # page title
+                dbc.Col([
+                    html.H3("Orders History"),
+                ], xs=6, sm=6, md=6, lg=6, xl=6, xxl=6, align="center"),
+
+                # add order button
+                dbc.Col([
+                    dbc.Button([
+                        html.I(className="fa-solid fa-plus"),
+                        " Add Order"
+                    ], id='open', n_clicks=0)
+                ], xs=6, sm=6, md=6, lg=6, xl=6, xxl=6, className="d-flex justify-content-end"),
+            ], className="py-4", align="start"),
         
-        html.Div(id='status-div'),
-
-        # add order modal
-        dbc.Modal(
-            [
-                dbc.ModalHeader(dbc.ModalTitle("Add Order")),
-                dbc.ModalBody([
-                    html.P(children="", id="add-order-error"),       
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Label('Order ID'),
-                            dbc.Input(id='order-id', placeholder='Enter Order ID')
-                        ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
-                        dbc.Col([
-                            dbc.Label('Product ID'),
-                            dbc.Input(id='product-id', placeholder='Enter Product ID')
-                        ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
-                        dbc.Col([
-                            dbc.Label('Customer ID'),
-                            dbc.Input(id='customer-id', placeholder='Enter Customer ID')
-                        ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
-                        dbc.Col([
-                            dbc.Label('Quantity'),
-                            dbc.Input(id='quantity-id', placeholder='Enter Quantity')
-                        ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
-                        dbc.Col([
-                            dbc.Label('Discount'),
-                            dbc.Input(id='discount-id', placeholder='Enter Discount (0 - 1)')
-                        ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2")
-                    ], className="py-2"),
-                ]),
-                dbc.ModalFooter([
-                    dbc.Button(
-                        "Close", id="close", className="ms-auto", n_clicks=0
-                    ),
-                    dbc.Button(
-                        "Add Order", id='button-add', n_clicks=0
+            html.Div(id='status-div'),
+
+            # add order modal
+            dbc.Modal(
+                [
+                    dbc.ModalHeader(dbc.ModalTitle("Add Order")),
+                    dbc.ModalBody([
+                        html.P(children="", id="add-order-error"),       
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Label('Order ID'),
+                                dbc.Input(id='order-id', placeholder='Enter Order ID')
+                            ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
+                            dbc.Col([
+                                dbc.Label('Product ID'),
+                                dbc.Input(id='product-id', placeholder='Enter Product ID')
+                            ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
+                            dbc.Col([
+                                dbc.Label('Customer ID'),
+                                dbc.Input(id='customer-id', placeholder='Enter Customer ID')
+                            ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
+                            dbc.Col([
+                                dbc.Label('Quantity'),
+                                dbc.Input(id='quantity-id', placeholder='Enter Quantity')
+                            ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2"),
+                            dbc.Col([
+                                dbc.Label('Discount'),
+                                dbc.Input(id='discount-id', placeholder='Enter Discount (0 - 1)')
+                            ], xs=12, sm=12, md=12, lg=12, xl=12, xxl=12, className="p-2")
+                        ], className="py-2"),
+                    ]),
+                    dbc.ModalFooter([
+                        dbc.Button(
+                            "Close", id="close", className="ms-auto", n_clicks=0
+                        ),
+                        dbc.Button(
+                            "Add Order", id='button-add', n_clicks=0
+                        )
+                    ])
+                ],
+                id="modal",
+                is_open=False
+            ),
+            # hierarchy dropdowns (country > state > city)
+            dbc.Row([
+                dbc.Col([
+                    dcc.Dropdown(
+                        id='country-dropdown',
+                        options=country_options,
+                        value=None,
+                        placeholder="Select a country"
+                    )
+                ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
+                dbc.Col([
+                    dcc.Dropdown(
+                        id='state-dropdown',
+                        options=[],
+                        value=None,
+                        placeholder="Select a state"
+                    )
+                ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
+                dbc.Col([
+                    dcc.Dropdown(
+                        id='city-dropdown',
+                        options=[],
+                        value=None,
+                        placeholder="Select a city"
+                    )
+                ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
+
+            ], className="filterDiv", justify="start"),
+
+            dcc.Interval(
+                id='alert-clear-interval',
+                interval=3000,
+                n_intervals=0,
+                disabled=True
+            ),
+
+            dbc.Row([
+                dcc.Loading([
+                    dash_table.DataTable(
+                        id='records-datatable',
+                        data=[],
+                        columns=[{"name": i, "id": i} for i in dataset.orders.columns],
+                        page_current=0,
+                        page_size=PAGE_SIZE,
+                        page_action='custom',
+                        style_as_list_view=True,
+                        sort_action='custom',
+                        sort_mode='single',
+                        sort_by=[{'column_id': 'Order Date', 'direction': 'desc'}],
+                        filter_action='custom',
+                        filter_query='',
+                        style_table={'overflowX': 'auto'},
+                        style_cell={'textAlign': 'left'}
                     )
                 ])
-            ],
-            id="modal",
-            is_open=False
-        ),
-        # hierarchy dropdowns (country > state > city)
-        dbc.Row([
-            dbc.Col([
-                dcc.Dropdown(
-                    id='country-dropdown',
-                    options=country_options,
-                    value=None,
-                    placeholder="Select a country"
-                )
-            ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
-            dbc.Col([
-                dcc.Dropdown(
-                    id='state-dropdown',
-                    options=[],
-                    value=None,
-                    placeholder="Select a state"
-                )
-            ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
-            dbc.Col([
-                dcc.Dropdown(
-                    id='city-dropdown',
-                    options=[],
-                    value=None,
-                    placeholder="Select a city"
-                )
-            ], xs=12, sm=12, md=3, lg=2, xl=2, xxl=2, className="p-2"),
-
-        ], className="filterDiv", justify="start"),
-
-        dcc.Interval(
-            id='alert-clear-interval',
-            interval=3000,
-            n_intervals=0,
-            disabled=True
-        ),
-
-        dbc.Row([
-            dcc.Loading([
-                dash_table.DataTable(
-                    id='records-datatable',
-                    data=[],
-                    columns=[{"name": i, "id": i} for i in df.columns],
-                    page_size=10,
-                    style_as_list_view=True,
-                    sort_action='native',
-                    sort_by=[{'column_id': 'Order Date', 'direction': 'desc'}],
-                    style_table={'overflowX': 'auto'},
-                    style_cell={'textAlign': 'left'}
-                )
-            ])
-        ], className='datatable-row')
-    ], className="p-4"
-)
+            ], className='datatable-row')
+        ], className="p-4"
+    )
 
 
-# - Form alert callback
-@callback(
+# - Form alert callback (assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='clear_alert'),
     [
         Output('status-div', 'children', allow_duplicate=True),
         Output('alert-clear-interval', 'disabled', allow_duplicate=True),
@@ -140,14 +176,11 @@ layout = html.Div(
     Input('alert-clear-interval', 'n_intervals'),
     prevent_initial_call=True
 )
-def clear_alert(n_intervals):
-    if n_intervals > 0:
-        return None, True, 0
-    return dash.no_update, dash.no_update, dash.no_update    
 
 
-# - Open and close modal callback
-@callback(
+# - Open and close modal callback (assets/clientside.js)
+clientside_callback(
+    ClientsideFunction(namespace='ui', function_name='toggle_modal'),
     Output("modal", "is_open", allow_duplicate=True),
     [
         Input("open", "n_clicks"), 
@@ -156,10 +189,6 @@ def clear_alert(n_intervals):
     State("modal", "is_open"),
     prevent_initial_call=True
 )
-def toggle_modal(n1, n2, is_open):
-    if n1 or n2:
-        return not is_open
-    return is_open
 
 
 # - Fill state dropdown after country select
@@ -171,10 +200,10 @@ def toggle_modal(n1, n2, is_open):
     Input('country-dropdown', 'value'),
     prevent_initial_call=True
 )
+@instrument
 def set_states_options(selected_country):
     if selected_country is not None:
-        states = df[df['Country'] == selected_country]['State'].unique()
-        return [{'label': state, 'value': state} for state in states], None
+        return [{'label': state, 'value': state} for state in get_dataset().geo.states(selected_country)], None
     return [], None
 
 
@@ -190,37 +219,47 @@ def set_states_options(selected_country):
     ],
     prevent_initial_call=True
 )
+@instrument
 def set_cities_options(selected_country, selected_state):
     if selected_country and selected_state:
-        filtered_df = df[(df['Country'] == selected_country) & (df['State'] == selected_state)]
-        cities = filtered_df['City'].unique()
-        return [{'label': city, 'value': city} for city in cities], None
+        return [{'label': city, 'value': city} for city in get_dataset().geo.cities(selected_country, selected_state)], None
     return [], None
 
 
-# - Filter datatable based on selected dropdowns
+# - Serve the visible page of the datatable, filtered by the dropdowns and column filters
 @callback(
-    Output('records-datatable', 'data'),
+    [
+        Output('records-datatable', 'data'),
+        Output('records-datatable', 'page_count'),
+        Output('records-datatable', 'page_current')
+    ],
     [
         Input('country-dropdown', 'value'),
         Input('state-dropdown', 'value'),
-        Input('city-dropdown', 'value')
+        Input('city-dropdown', 'value'),
+        Input('records-datatable', 'page_current'),
+        Input('records-datatable', 'page_size'),
+        Input('records-datatable', 'sort_by'),
+        Input('records-datatable', 'filter_query')
     ]
 )
-def update_table(selected_country, selected_state, selected_city):
-    
-    filtered_df = df.copy()
+@instrument
+def update_table(selected_country, selected_state, selected_city, page_current, page_size, sort_by, filter_query):
+    table, sort_index = current_table()
+    rows = get_dataset().geo.rows(selected_country, selected_state, selected_city)
 
-    if selected_country:
-        filtered_df = filtered_df[filtered_df['Country'] == selected_country]
+    mask = filter_mask(table, filter_query)
+    if mask is not None:
+        rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
 
-    if selected_state:
-        filtered_df = filtered_df[filtered_df['State'] == selected_state]
+    # Any change other than paging starts over from the first page
+    if 'records-datatable.page_current' not in dash.ctx.triggered_prop_ids:
+        page_current = 0
 
-    if selected_city:
-        filtered_df = filtered_df[filtered_df['City'] == selected_city]
+    page_size = page_size or PAGE_SIZE
+    page_rows, total = select_page(sort_index, rows, sort_by, page_current or 0, page_size)
 
-    return filtered_df.to_dict('records')
+    return format_dates(table.take(page_rows)).to_dict('records'), max(math.ceil(total / page_size), 1), page_current
 
 
 # - Add order into datatable.
@@ -246,25 +285,41 @@ def update_table(selected_country, selected_state, selected_city):
         State('customer-id', 'value'),
         State('quantity-id', 'value'),
         State('discount-id', 'value'),
+        State('records-datatable', 'data')
     ],
     prevent_initial_call=True
 )
-def add_entry_to_table(n_clicks, order_id, product_id, customer_id, quantity_id, discount_id):
-    new_df = df.copy()
-
+@instrument
+def add_entry_to_table(n_clicks, order_id, product_id, customer_id, quantity_id, discount_id, table_data):
+    error = None
     if not order_id or not product_id:
         error = "Order ID and Product ID are required."
-        return (
-            dash.no_update,
-            order_id, product_id, customer_id, quantity_id, discount_id,
-            dash.no_update,
-            error,
-            True,
-            True
-        )
+    else:
+        try:
+            quantity = int(quantity_id) if quantity_id not in (None, '') else None
+            discount = float(discount_id) if discount_id not in (None, '') else None
+        except ValueError:
+            quantity = discount = None
+            error = "Quantity must be a whole number and Discount a number."
+        if quantity is not None and quantity <= 0:
+            error = "Quantity must be a positive whole number."
+        if discount is not None and not 0 <= discount <= 1:
+            error = "Discount must be between 0 and 1."
 
-    if new_df[(new_df['Order ID'] == order_id) & (new_df['Product ID'] == product_id)].empty is False:
-        error = "This order and product combination already exists."
+    if error is None:
+        try:
+            new_rows = get_dataset().add_order({
+                'Order ID': order_id,
+                'Product ID': product_id,
+                'Customer ID': customer_id,
+                'Quantity': quantity,
+                'Discount': discount,
+                'Order Date': datetime.today().strftime('%Y-%m-%d')
+            })
+        except DuplicateOrderError:
+            error = "This order and product combination already exists."
+
+    if error is not None:
         return (
             dash.no_update,
             order_id, product_id, customer_id, quantity_id, discount_id,
@@ -274,19 +329,10 @@ def add_entry_to_table(n_clicks, order_id, product_id, customer_id, quantity_id,
             True
         )
 
-    new_entry = pd.DataFrame([{
-        'Order ID': order_id,
-        'Product ID': product_id,
-        'Customer ID': customer_id,
-        'Quantity': quantity_id,
-        'Discount': discount_id,
-        'Order Date': datetime.today().strftime('%Y-%m-%d')
-    }])
-    new_df = pd.concat([new_df, new_entry], ignore_index=True)
-
+    # Show the new entry on top of the current page instead of resending the whole table
     success_alert = dbc.Alert("Entry added successfully!", color="success")
     return (
-        new_df.to_dict('records'),
+        format_dates(new_rows).to_dict('records') + (table_data or [])[:PAGE_SIZE - 1],
         None, None, None, None, None,
         success_alert,
         "",
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import urllib.parse
+import urllib.request
+import dash
+import dash_bootstrap_components as dbc
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+EXTERNAL_STYLESHEETS = [
+    'https://fonts.googleapis.com/css2?family=Public+Sans:wght@400;500;600;700;800;900&display=swap',
+    dbc.themes.PULSE,
+    dbc.icons.FONT_AWESOME
+]
+
+# Local copies of the external stylesheets and the fonts they load, written by `python -m services.assets`.
+# The copies are named *.vendor.css so Dash does not add them after the app's own CSS (see VENDOR_IGNORE).
+VENDOR_DIR = 'vendor'
+VENDOR_MANIFEST = os.path.join(ASSETS_DIR, VENDOR_DIR, 'stylesheets.json')
+VENDOR_IGNORE = r'\.vendor\.css$'
+
+# Google Fonts serves woff2 only to browsers it recognizes
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def asset_url(path):
+    # URL of a file in assets/, versioned by its modification time like the CSS and JS Dash links itself,
+    # so it can be cached as immutable.
+    return f"{dash.get_asset_url(path)}?m={int(os.stat(os.path.join(ASSETS_DIR, path)).st_mtime)}"
+
+
+def stylesheets():
+    # The bundled stylesheets when they were downloaded, so the page loads without external fetches,
+    # otherwise the CDN ones.
+    if not os.path.exists(VENDOR_MANIFEST):
+        return EXTERNAL_STYLESHEETS
+    with open(VENDOR_MANIFEST) as f:
+        return [asset_url(f'{VENDOR_DIR}/{name}') for name in json.load(f)]
+
+
+def _fetch(url):
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+
+def _save(content, suffix):
+    # Content-hashed name, a changed upstream file never collides with a cached one.
+    name = f'{hashlib.sha256(content).hexdigest()[:16]}{suffix}'
+    with open(os.path.join(ASSETS_DIR, VENDOR_DIR, name), 'wb') as f:
+        f.write(content)
+    return name
+
+
+def _bundle_css(url):
+    # Download a stylesheet and everything it references (fonts, imported CSS), pointing it at the local copies.
+    css = _fetch(url).decode('utf-8')
+
+    def localize(match):
+        reference = match.group(2)
+        if reference.startswith('data:'):
+            return match.group(0)
+        absolute = urllib.parse.urljoin(url, reference)
+        path = urllib.parse.urlsplit(absolute).path
+        suffix = os.path.splitext(path)[1]
+        if suffix == '.css' or 'fonts.googleapis.com/css' in absolute:
+            name = _bundle_css(absolute)
+        else:
+            name = _save(_fetch(absolute), suffix)
+        return f'url({name})'
+
+    css = CSS_URL.sub(localize, css)
+    return _save(css.encode('utf-8'), '.vendor.css')
+
+
+def bundle_stylesheets():
+    os.makedirs(os.path.join(ASSETS_DIR, VENDOR_DIR), exist_ok=True)
+    names = [_bundle_css(url) for url in EXTERNAL_STYLESHEETS]
+    with open(VENDOR_MANIFEST, 'w') as f:
+        json.dump(names, f, indent=2)
+    return names
+
+
+if __name__ == '__main__':
+    for name in bundle_stylesheets():
+        print(os.path.join(ASSETS_DIR, VENDOR_DIR, name), file=sys.stderr)
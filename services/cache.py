@@ -0,0 +1,226 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from plotly.io.json import to_json_plotly
+from services.dataset import get_dataset
+
+# 'memory' keeps a per-process LRU, 'filesystem' shares entries between all gunicorn workers
+CACHE_BACKEND = os.environ.get('CALLBACK_CACHE_BACKEND', 'memory')
+# /dev/shm is RAM backed, so the shared cache lives in shared memory where the OS provides it.
+# Entries are pickles, so the directory is one per user and only that user may use it (private_directory).
+CACHE_DIR = os.environ.get('CALLBACK_CACHE_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f'aldi-callback-cache-{os.getuid()}'
+))
+DEFAULT_MAXSIZE = int(os.environ.get('CALLBACK_CACHE_SIZE', 256))
+DEFAULT_TTL = float(os.environ.get('CALLBACK_CACHE_TTL', 0)) or None
+
+_MISSING = object()
+_caches = {}
+
+
+class LRUCache:
+    # Bounded, thread-safe in-process LRU map that counts hits, misses and evictions.
+    shared = False
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+def private_directory(path):
+    # Create a directory only this user can enter, and refuse one someone else created or opened up first:
+    # whoever can write to it could plant a pickle the app would then load.
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f'{path} must be a directory owned by uid {os.getuid()} with mode 0700')
+    return path
+
+
+class FileSystemCache(LRUCache):
+    # One pickle file per entry in a directory every worker can read, so a result computed once serves all.
+    # Like Redis GET / SETEX: writes are atomic renames, entries may expire, the least recently used are pruned.
+    shared = True
+    PRUNE_EVERY = 32
+
+    def __init__(self, directory, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL):
+        super().__init__(maxsize, ttl)
+        self.directory = directory
+        self._writes = 0
+        private_directory(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key, default=_MISSING):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            expires_at, value = 0, default
+
+        if expires_at is not None and expires_at <= time.time():
+            self.misses += 1
+            return default
+
+        # Reads refresh the mtime, which is what pruning orders by
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((time.time() + ttl if ttl else None, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def _entries_by_age(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                # Removed by another worker since the listing
+                pass
+        return [entry for _, entry in sorted(entries, key=lambda pair: pair[0])]
+
+    def prune(self):
+        entries = self._entries_by_age()
+        for entry in entries[:max(len(entries) - self.maxsize, 0)]:
+            try:
+                os.remove(entry.path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for entry in self._entries_by_age():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return len(self._entries_by_age())
+
+
+def get_cache(name, maxsize=DEFAULT_MAXSIZE):
+    # The cache registered under a name, created with the configured backend on first use.
+    if name not in _caches:
+        if CACHE_BACKEND == 'filesystem':
+            _caches[name] = FileSystemCache(os.path.join(private_directory(CACHE_DIR), name), maxsize)
+        else:
+            _caches[name] = LRUCache(maxsize)
+    return _caches[name]
+
+
+def normalize(value):
+    # Collapse equivalent callback inputs ('2017' / 2017, lists / tuples) onto one hashable key.
+    if isinstance(value, str):
+        stripped = value.strip()
+        return int(stripped) if stripped.lstrip('-').isdigit() else stripped
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize(item)) for key, item in value.items()))
+    return value
+
+
+def cached(name, key, compute):
+    # Look up a computed value (e.g. an aggregate frame) by key and dataset version, computing it on a miss.
+    cache = get_cache(name)
+    full_key = (get_dataset().version_key, normalize(key))
+    value = cache.get(full_key)
+    if value is _MISSING:
+        value = compute()
+        cache.set(full_key, value)
+    return value
+
+
+def memoize(maxsize=DEFAULT_MAXSIZE):
+    # Cache a callback's result per normalized inputs and dataset version; new orders or a reload miss.
+    # Shared backends store the result as JSON text, which decodes to plain dicts Dash can send as-is.
+    def decorator(func):
+        cache = get_cache(f'{func.__module__}.{func.__qualname__}', maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (get_dataset().version_key, normalize(args))
+            result = cache.get(key)
+            if result is _MISSING:
+                result = func(*args)
+                cache.set(key, to_json_plotly(result) if cache.shared else result)
+            elif cache.shared:
+                result = json.loads(result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,160 @@
+import pandas as pd
+
+MEASURES = ['Sales', 'Profit', 'Quantity', 'Count']
+
+
+def add_totals(totals, delta):
+    # Fold a frame of additive totals into another, aligned on the index; only the delta's keys change.
+    return totals.add(delta, fill_value=0).astype(totals.dtypes.to_dict())
+
+
+def between(frame, start_d, end_d):
+    # Rows of a date-indexed frame within [start_d, end_d], located by binary search.
+    lo = frame.index.searchsorted(pd.Timestamp(start_d), side='left')
+    hi = frame.index.searchsorted(pd.Timestamp(end_d), side='right')
+    return frame.iloc[lo:hi]
+
+
+def rank_products(quantities):
+    # Stable, so products with equal quantities keep their Product ID order however the totals were built
+    return quantities.sort_values(by='Quantity', ascending=False, kind='stable')
+
+
+class TimeCube:
+    # Daily / monthly / yearly Orders totals, built once so the Home page callbacks only slice.
+    def __init__(self, orders):
+        by_day = orders.groupby('Order Date')
+        self.daily = by_day[['Sales', 'Profit', 'Quantity']].sum().assign(Count=by_day.size())
+
+        days = self.daily.index
+        self.monthly = self.daily.groupby([days.year.rename('Year'), days.month.rename('Month')]).sum()
+        self.yearly = self.monthly.groupby(level='Year').sum()
+        self.years = sorted(self.yearly.index, reverse=True)
+
+        # Quantity sold per product, ranked within each year
+        products = orders.groupby(
+            [orders['Order Date'].dt.year.rename('Year'), 'Product ID', 'Product Name'], observed=True
+        )['Quantity'].sum()
+        self.products = {
+            year: rank_products(ranking.droplevel('Year').reset_index())
+            for year, ranking in products.groupby(level='Year')
+        }
+
+    def add(self, orders):
+        # Fold newly added orders in, touching only the days, months, years and products they fall in.
+        delta = TimeCube(orders)
+        self.daily = add_totals(self.daily, delta.daily)
+        self.monthly = add_totals(self.monthly, delta.monthly)
+        self.yearly = add_totals(self.yearly, delta.yearly)
+        self.years = sorted(self.yearly.index, reverse=True)
+
+        for year, ranking in delta.products.items():
+            if year in self.products:
+                ranking = pd.concat([self.products[year], ranking]).groupby(
+                    ['Product ID', 'Product Name'], as_index=False, observed=True
+                )['Quantity'].sum()
+            self.products[year] = rank_products(ranking)
+
+    def year_totals(self, year):
+        if year not in self.yearly.index:
+            return pd.Series(0, index=MEASURES)
+        return self.yearly.loc[year]
+
+    def months(self, year):
+        # Monthly totals of a year, indexed by month number.
+        if year not in self.yearly.index:
+            return self.monthly.iloc[:0].droplevel('Year')
+        return self.monthly.loc[year]
+
+    def days(self, year, month):
+        # Daily totals of a month, located by binary search on the sorted date index.
+        start = pd.Timestamp(year, month, 1)
+        lo, hi = self.daily.index.searchsorted([start, start + pd.offsets.MonthBegin(1)])
+        return self.daily.iloc[lo:hi]
+
+    def top_products(self, year, n=10):
+        if year not in self.products:
+            return pd.DataFrame(columns=['Product ID', 'Product Name', 'Quantity'])
+        return self.products[year].head(n)
+
+
+class DailyStats:
+    # Additive per-day partials of the Graphs page measures, so any period is a sum over its days.
+    def __init__(self, merged):
+        by_day = merged.groupby('Order Date')
+        self.daily = pd.DataFrame({
+            'Days to Ship Sum': by_day['Days to Ship'].sum(),
+            'Days to Ship Count': by_day['Days to Ship'].count(),
+            'Discount Sum': by_day['Discount'].sum(),
+            'Discount Count': by_day['Discount'].count(),
+            'Profit': by_day['Profit'].sum(),
+            'Quantity': by_day['Quantity'].sum(),
+            'Sales': by_day['Sales'].sum(),
+            'Returned': by_day['Is Returned'].sum(),
+            'Ship Mode Count': by_day['Ship Mode'].count()
+        })
+
+    def add(self, merged):
+        self.daily = add_totals(self.daily, DailyStats(merged).daily)
+
+    def between(self, start_d, end_d):
+        return between(self.daily, start_d, end_d)
+
+
+class BreakdownStats:
+    # Additive per (day, breakdown value) partials of the bubble chart metrics, one table per breakdown,
+    # so any date range is a sum over its days and values instead of a pass over the order rows.
+    DIMENSIONS = ['Segment', 'Ship Mode', 'Customer Name', 'Category', 'Sub-Category', 'Product Name']
+
+    def __init__(self, merged, seen_orders=frozenset()):
+        # The first row of every order carries its distinct-order return flag
+        first_rows = ~merged['Order ID'].duplicated()
+        if seen_orders:
+            # Looked up per row, the rows being few where orders were seen already (those added later)
+            first_rows &= merged['Order ID'].map(lambda order_id: order_id not in seen_orders)
+        self.orders = set(merged['Order ID'])
+
+        partials = pd.DataFrame({
+            'Order Date': merged['Order Date'],
+            'Count': merged['Row ID'].notna().astype('int64'),
+            'Sales': merged['Sales'],
+            'Profit': merged['Profit'],
+            'Quantity': merged['Quantity'],
+            'Discount Sum': merged['Discount'],
+            'Discount Count': merged['Discount'].notna().astype('int64'),
+            'Days to Ship Sum': merged['Days to Ship'],
+            'Days to Ship Count': merged['Days to Ship'].notna().astype('int64'),
+            'Returned': merged['Is Returned'].astype('int64'),
+            'Orders Returned': merged['Is Returned'].where(first_rows, 0).astype('int64')
+        })
+        self.tables = {
+            dimension: partials.groupby(['Order Date', merged[dimension]], observed=True).sum()
+            for dimension in self.DIMENSIONS
+        }
+        # The tables are sorted by day, so a date range is located by binary search on the first level
+        self.dates = {dimension: table.index.get_level_values('Order Date') for dimension, table in self.tables.items()}
+        # Partials of the orders added later, kept apart and summed with the tables above, so an order only
+        # touches these small tables instead of re-sorting the full ones
+        self.added = {}
+
+    def add(self, merged):
+        delta = BreakdownStats(merged, self.orders)
+        self.orders.update(delta.orders)
+        for dimension, table in delta.tables.items():
+            added = self.added.get(dimension)
+            self.added[dimension] = table if added is None else add_totals(added, table).sort_index()
+
+    def between(self, dimension, start_d, end_d):
+        # Partials of the range summed per breakdown value.
+        totals = _range_totals(self.tables[dimension], self.dates[dimension], dimension, start_d, end_d)
+        added = self.added.get(dimension)
+        if added is not None:
+            added_dates = added.index.get_level_values('Order Date')
+            totals = add_totals(totals, _range_totals(added, added_dates, dimension, start_d, end_d))
+        return totals
+
+
+def _range_totals(table, dates, dimension, start_d, end_d):
+    lo = dates.searchsorted(pd.Timestamp(start_d), side='left')
+    hi = dates.searchsorted(pd.Timestamp(end_d), side='right')
+    return table.iloc[lo:hi].groupby(level=dimension, observed=True).sum()
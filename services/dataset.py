@@ -0,0 +1,347 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import pandas as pd
+from flask import g, has_request_context
+from services.cube import BreakdownStats, DailyStats, TimeCube
+from services.geo_index import GeoIndex
+from services.lazy import Lazy
+from services.order_store import STORE_PATH, DuplicateOrderError, OrderStore
+from services.table_query import OrdersTable
+
+# Pages share the canonical frames below, copy-on-write keeps their views from leaking writes back.
+pd.set_option('mode.copy_on_write', True)
+
+DATA_PATH = os.environ.get('DATA_PATH', 'data/sample.xlsx')
+# An empty DATA_CACHE_DIR disables the Feather cache.
+CACHE_DIR = os.environ.get('DATA_CACHE_DIR', 'data/cache')
+SHEETS = ['Orders', 'Returns']
+
+# Bump when the typed schema changes so stale cache files are rebuilt.
+SCHEMA_VERSION = 3
+# Dates stay datetime64, pages format them only when rows are sent to the browser
+DATE_COLUMNS = ['Order Date', 'Ship Date']
+# Repeated text is stored once per distinct value; the IDs stay text since added orders bring new ones
+CATEGORY_COLUMNS = [
+    'Ship Mode', 'Segment', 'Country', 'City', 'State', 'Region',
+    'Category', 'Sub-Category', 'Customer Name', 'Product Name'
+]
+# Whole numbers well within int32; Sales, Profit and Discount stay float64 as float32 would alter the amounts shown
+INT32_COLUMNS = ['Row ID', 'Postal Code', 'Quantity']
+
+# Attributes an added order inherits from earlier orders of the same product / customer
+PRODUCT_COLUMNS = ['Product Name', 'Category', 'Sub-Category']
+CUSTOMER_COLUMNS = ['Customer Name', 'Segment']
+
+_generations = itertools.count()
+
+
+class Dataset:
+    # Canonical Orders / Returns frames, loaded once per process.
+    def __init__(self, orders, returns, store=None, source=None):
+        self.orders = orders
+        self.returns = returns
+
+        # Orders joined with their return flag and shipping delay, used by the Graphs page.
+        # Shares the row order of orders, i.e. sorted by Order Date.
+        self.returned = returns.drop_duplicates(subset='Order ID').set_index('Order ID')['Returned']
+        self.merged = self.merge_returns(orders)
+
+        # Held while new orders are folded into the built structures; builds run outside it, so a request
+        # syncing orders never waits for a page's data being built, and vice versa
+        self._sync_lock = threading.Lock()
+        # (value, 'added' or 'added_merged') of the derived structures built, the ones sync() folds new orders into
+        self._live = []
+        # {'added': orders, 'added_merged': merged} per sync that brought new orders, for a build to catch up
+        # on those synced meanwhile
+        self._batches = []
+
+        # Pre-aggregated totals backing the pages, each built when its page first needs it (or by the warmup)
+        self._cube = self._derived(TimeCube, orders, 'added')
+        self._daily_stats = self._derived(DailyStats, self.merged, 'added_merged')
+        self._breakdowns = self._derived(BreakdownStats, self.merged, 'added_merged')
+        self._geo = Lazy(lambda: GeoIndex(orders))
+        # DataTable rows (the workbook orders, then the added ones) and their sort index, kept together so a
+        # request reads both from the dataset it is pinned to
+        self._table = self._derived(OrdersTable, orders, 'added')
+
+        # Orders added through the DataTable page, appended to the shared store and tailed from it
+        self.store = store
+        self.added = conform_orders(orders.iloc[:0], orders)
+        self.added_merged = self.merge_returns(self.added)
+        self.products = orders.drop_duplicates(subset='Product ID').set_index('Product ID')[PRODUCT_COLUMNS]
+        self.customers = orders.drop_duplicates(subset='Customer ID').set_index('Customer ID')[CUSTOMER_COLUMNS]
+        self.store_seq = 0
+        self.version = 0
+        # Identifies the workbook the frames came from, the same in every worker
+        self.source = source or f'dataset-{next(_generations)}'
+        self.order_keys = set(zip(orders['Order ID'], orders['Product ID']))
+
+    def _derived(self, build, rows, added):
+        # Built from the workbook rows plus the orders added so far, without holding the sync lock. Orders synced
+        # during the build are added under it, where the value also joins the ones sync() keeps up to date.
+        def derive():
+            with self._sync_lock:
+                known, batches = getattr(self, added), len(self._batches)
+            value = build(rows)
+            if not known.empty:
+                value.add(known)
+            with self._sync_lock:
+                for batch in self._batches[batches:]:
+                    value.add(batch[added])
+                self._live.append((value, added))
+            return value
+        return Lazy(derive)
+
+    def build(self):
+        # Build every derived structure now instead of on first use, e.g. before a reloaded dataset is swapped in.
+        for derived in [self._cube, self._daily_stats, self._breakdowns, self._geo, self._table]:
+            derived()
+        return self
+
+    @property
+    def cube(self):
+        return self._cube()
+
+    @property
+    def daily_stats(self):
+        return self._daily_stats()
+
+    @property
+    def breakdowns(self):
+        return self._breakdowns()
+
+    @property
+    def geo(self):
+        return self._geo()
+
+    @property
+    def table(self):
+        # (rows, sort index) of the DataTable page
+        return self._table().current
+
+    @property
+    def version_key(self):
+        # Changes whenever the data behind the aggregates does (another workbook or newly added orders).
+        # Built from the workbook fingerprint and the store's global sequence, so all workers agree on it.
+        return self.source, self.store_seq
+
+    def merge_returns(self, orders):
+        returned = orders['Order ID'].map(self.returned)
+        return orders.assign(**{
+            'Days to Ship': (orders['Ship Date'] - orders['Order Date']).dt.days,
+            'Returned': returned,
+            # 0 / 1 flag so return counts are plain sums
+            'Is Returned': returned.eq('Yes').astype('int8')
+        })
+
+    def has_order(self, order_id, product_id):
+        return (order_id, product_id) in self.order_keys
+
+    def add_order(self, entry):
+        # Persist a new order and pull it (plus anything other workers appended) into this process.
+        self.sync()
+        if self.has_order(entry['Order ID'], entry['Product ID']):
+            raise DuplicateOrderError(f"{entry['Order ID']} / {entry['Product ID']}")
+        self.store.append(entry)
+        return self.sync()
+
+    def sync(self):
+        # Read the orders appended to the store since the last sync and return them.
+        if self.store is None:
+            return self.added.iloc[:0]
+
+        # Most requests find nothing new, and leave without waiting for the lock
+        new = self.store.read_since(self.store_seq)
+        if new.empty:
+            return self.added.iloc[:0]
+
+        with self._sync_lock:
+            # Another thread may have folded some of them in meanwhile
+            new = new[new['seq'] > self.store_seq]
+            if new.empty:
+                return self.added.iloc[:0]
+
+            self.store_seq = int(new['seq'].iloc[-1])
+            for column in PRODUCT_COLUMNS:
+                new[column] = new['Product ID'].map(self.products[column])
+            for column in CUSTOMER_COLUMNS:
+                new[column] = new['Customer ID'].map(self.customers[column])
+            new = conform_orders(new, self.orders)
+            batch = {'added': new, 'added_merged': self.merge_returns(new)}
+
+            # Derived structures absorb only the new rows; those not built yet include them when they are
+            for value, added in self._live:
+                value.add(batch[added])
+            self._batches.append(batch)
+
+            new_merged = batch['added_merged']
+            if self.added.empty:
+                self.added, self.added_merged = new, new_merged
+            else:
+                self.added = pd.concat([self.added, new], ignore_index=True)
+                self.added_merged = pd.concat([self.added_merged, new_merged], ignore_index=True).sort_values(
+                    by='Order Date', kind='stable', ignore_index=True
+                )
+            self.order_keys.update(zip(new['Order ID'], new['Product ID']))
+            self.version += 1
+            return new
+
+
+def conform_orders(new, orders):
+    # Give store rows the Orders columns and dtypes, so they concatenate without upcasting.
+    conformed = new.reindex(columns=orders.columns)
+    if 'seq' in new:
+        conformed['Row ID'] = orders['Row ID'].max() + new['seq']
+    for column in CATEGORY_COLUMNS:
+        conformed[column] = pd.Categorical(conformed[column], dtype=orders[column].dtype)
+    for column in DATE_COLUMNS:
+        conformed[column] = pd.to_datetime(conformed[column])
+    for column in orders.columns:
+        # A value left blank reads back from the store as None, which would make the column object
+        if pd.api.types.is_numeric_dtype(orders[column].dtype):
+            conformed[column] = pd.to_numeric(conformed[column], errors='coerce')
+    for column in INT32_COLUMNS:
+        # Missing values (e.g. no quantity entered) keep the column float
+        if not conformed[column].hasnans:
+            conformed[column] = conformed[column].astype(orders[column].dtype)
+    return conformed
+
+
+def apply_schema(orders):
+    # Coerce the Orders sheet to the dtypes the pages rely on.
+    orders = orders.copy(deep=False)
+    for column in DATE_COLUMNS:
+        orders[column] = pd.to_datetime(orders[column])
+    for column in CATEGORY_COLUMNS:
+        orders[column] = orders[column].astype('category')
+    for column in INT32_COLUMNS:
+        orders[column] = orders[column].astype('int32')
+    # Sorted by date (stable, so an order's lines stay together) for binary searched date ranges
+    return orders.sort_values(by='Order Date', kind='stable', ignore_index=True)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(path, cache_dir):
+    name = os.path.splitext(os.path.basename(path))[0]
+    sheet_paths = {sheet: os.path.join(cache_dir, f'{name}.{sheet.lower()}.feather') for sheet in SHEETS}
+    return sheet_paths, os.path.join(cache_dir, f'{name}.manifest.json')
+
+
+def _atomic_write(write, target):
+    # Write to a temp file first so a concurrently booting worker never reads a half-written cache.
+    tmp = f'{target}.{os.getpid()}.tmp'
+    write(tmp)
+    os.replace(tmp, target)
+
+
+def _dump_manifest(manifest, target):
+    with open(target, 'w') as f:
+        json.dump(manifest, f)
+
+
+def cache_is_current(path=DATA_PATH, cache_dir=CACHE_DIR):
+    # Whether the Feather cache was generated from the workbook as it is now.
+    sheet_paths, manifest_path = _cache_paths(path, cache_dir)
+    if not os.path.exists(manifest_path) or not all(os.path.exists(p) for p in sheet_paths.values()):
+        return False
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('schema') != SCHEMA_VERSION:
+        return False
+
+    stat = os.stat(path)
+    if manifest.get('mtime_ns') != stat.st_mtime_ns or manifest.get('size') != stat.st_size:
+        # Touched but possibly unchanged workbook, fall back to the content hash.
+        if manifest.get('sha256') != _file_hash(path):
+            return False
+        manifest.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        _atomic_write(lambda tmp: _dump_manifest(manifest, tmp), manifest_path)
+    return True
+
+
+def _read_cache(path, cache_dir):
+    # Return the cached sheets if they were generated from the current workbook, else None.
+    if not cache_is_current(path, cache_dir):
+        return None
+    sheet_paths, _ = _cache_paths(path, cache_dir)
+    return {sheet: pd.read_feather(p) for sheet, p in sheet_paths.items()}
+
+
+def _write_cache(path, cache_dir, sheets):
+    sheet_paths, manifest_path = _cache_paths(path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    for sheet, sheet_path in sheet_paths.items():
+        _atomic_write(lambda tmp: sheets[sheet].to_feather(tmp), sheet_path)
+
+    stat = os.stat(path)
+    manifest = {'schema': SCHEMA_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                'sha256': _file_hash(path)}
+    _atomic_write(lambda tmp: _dump_manifest(manifest, tmp), manifest_path)
+
+
+def read_sheets(path=DATA_PATH, cache_dir=CACHE_DIR):
+    # Typed Orders and Returns sheets, from the Feather cache when it matches the workbook.
+    sheets = _read_cache(path, cache_dir) if cache_dir else None
+    if sheets is None:
+        # Parse the workbook once for both sheets.
+        sheets = pd.read_excel(path, engine='openpyxl', sheet_name=SHEETS)
+        sheets['Orders'] = apply_schema(sheets['Orders'])
+        if cache_dir:
+            _write_cache(path, cache_dir, sheets)
+    return sheets
+
+
+def load_dataset(path=DATA_PATH, cache_dir=CACHE_DIR, store_path=STORE_PATH):
+    stat = os.stat(path)
+    sheets = read_sheets(path, cache_dir)
+    dataset = Dataset(sheets['Orders'], sheets['Returns'], OrderStore(store_path) if store_path else None,
+                      source=f'{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}')
+    dataset.sync()
+    return dataset
+
+
+# Loaded on first use, or by the warmup
+_dataset = Lazy(load_dataset, name='Dataset')
+
+
+def get_dataset():
+    # Within a request always the same snapshot, so a callback running while the dataset is swapped
+    # finishes on the version it started with.
+    if has_request_context():
+        if 'dataset' not in g:
+            g.dataset = _dataset()
+        return g.dataset
+    return _dataset()
+
+
+def set_dataset(dataset):
+    # Serve another dataset (a reloaded workbook, or one generated for a benchmark) from the next request on.
+    # Its version key differs, so nothing cached for the previous one is served.
+    _dataset.set(dataset)
+
+
+def get_orders():
+    # Shallow view of the Orders frame, writes on it copy instead of touching the shared data.
+    return get_dataset().orders.copy(deep=False)
+
+
+def get_merged():
+    # Shallow view of Orders merged with Returns.
+    return get_dataset().merged.copy(deep=False)
+
+
+if __name__ == '__main__':
+    # Refresh the Feather cache of a workbook: python -m services.dataset [path]
+    read_sheets(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH)
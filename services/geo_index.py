@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class GeoIndex:
+    # Country > State > City hierarchy with sorted dropdown options and the row positions of every node.
+    def __init__(self, orders):
+        cities = orders.groupby(['Country', 'State', 'City'], observed=True, sort=True).indices
+
+        self._rows = {}
+        self._children = {(): []}
+        for key in cities:
+            for depth in range(1, 4):
+                node = key[:depth]
+                if node not in self._children:
+                    self._children[node] = []
+                    self._children[key[:depth - 1]].append(node[-1])
+
+        # Row positions per node, ascending so a take keeps the original row order
+        self._rows.update(cities)
+        for depth in (2, 1):
+            for node in [n for n in self._children if len(n) == depth]:
+                self._rows[node] = np.sort(np.concatenate([self._rows[node + (child,)]
+                                                           for child in self._children[node]]))
+
+    @property
+    def countries(self):
+        return self._children[()]
+
+    def states(self, country):
+        return self._children.get((country,), [])
+
+    def cities(self, country, state):
+        return self._children.get((country, state), [])
+
+    def rows(self, country=None, state=None, city=None):
+        # Row positions for the selected node, None when nothing is selected.
+        node = ()
+        for part in (country, state, city):
+            if not part:
+                break
+            node += (part,)
+        if not node:
+            return None
+        return self._rows.get(node, np.empty(0, dtype=np.intp))
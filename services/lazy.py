@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+# 'background' builds every registered value in a thread at startup, 'off' leaves them to their first use
+WARMUP = os.environ.get('WARMUP', 'background')
+
+_registry = {}
+_warmup_thread = None
+
+
+class Lazy:
+    # Value built once on first use; concurrent callers wait for that one build instead of starting their own.
+    # Given a name it is registered, so the warmup builds it ahead of the first request and reports its build time.
+    def __init__(self, build, name=None):
+        self.name = name
+        self.build = build
+        self.seconds = None
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+        if name is not None:
+            _registry.setdefault(name, []).append(self)
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def __call__(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    start = time.perf_counter()
+                    self._value = self.build()
+                    self.seconds = time.perf_counter() - start
+                    self._ready = True
+        return self._value
+
+    def set(self, value):
+        # Replace the value in one step; callers get either the old or the new one, never a build in between.
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+    def reset(self):
+        # Build again on next use. The old value stays until then: a caller that just saw it ready reads it
+        # without the lock, and must get it rather than nothing.
+        with self._lock:
+            self._ready = False
+
+
+def registered():
+    return list(_registry)
+
+
+def warm_up(names=None, rebuild=False):
+    # Build the registered values (all, or those of the given names) in registration order;
+    # with rebuild, also those built already, e.g. the pages' data once the dataset was reloaded.
+    for name in names or list(_registry):
+        for value in _registry.get(name, []):
+            if rebuild:
+                value.reset()
+            value()
+
+
+def start_warmup():
+    # Warm everything in a daemon thread, so the server answers while the pages are still being built.
+    global _warmup_thread
+    if WARMUP == 'background' and _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=warm_up, name='warmup', daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+def startup_report():
+    # Seconds each name took to build, summed over its values; None while still pending.
+    report = {}
+    for name, values in _registry.items():
+        seconds = [value.seconds for value in values]
+        report[name] = None if None in seconds else sum(seconds)
+    return report
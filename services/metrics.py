@@ -0,0 +1,141 @@
+import contextlib
+import contextvars
+import fcntl
+import functools
+import glob
+import os
+import time
+from flask import g, has_request_context
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Histogram, generate_latest, multiprocess
+from prometheus_client.mmap_dict import MmapedDict
+from services.profiling import profile_background
+
+# With several gunicorn workers (and the background callback processes) every process writes its samples
+# to this directory and /metrics sums them up; without it the numbers are those of the answering process.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+# Metric types whose samples add up across processes, so those of exited processes can be folded together
+ADDITIVE_TYPES = ('counter', 'histogram')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 256 B to 16 MB, by powers of 4
+BYTE_BUCKETS = tuple(256 * 4 ** power for power in range(9))
+
+PHASE_SECONDS = Histogram(
+    'dash_callback_phase_seconds',
+    'Callback time per phase: data computation, figure construction and JSON serialization of the response',
+    ['callback', 'phase'], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'dash_callback_request_seconds',
+    'Wall time of the callback requests, from the request to the response being sent',
+    ['callback'], buckets=LATENCY_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    'dash_callback_response_bytes',
+    'Size of the callback responses before compression',
+    ['callback'], buckets=BYTE_BUCKETS
+)
+
+# (callback name, start of the running phase, phase durations) of the callback running in this context
+_running = contextvars.ContextVar('running_callback', default=None)
+
+
+def instrument(func):
+    # Time a callback, by default all of it as data computation; a lap('data') inside it ends that phase,
+    # and the rest counts as figure construction. Goes between @callback and @memoize.
+    # Also where a background callback picks up an on-demand profile (services/profiling.py).
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        laps = {}
+        token = _running.set((name, [time.perf_counter()], laps))
+        try:
+            return profile_background(func, *args)
+        finally:
+            lap('figure' if 'data' in laps else 'data')
+            _running.reset(token)
+            for phase, seconds in laps.items():
+                PHASE_SECONDS.labels(name, phase).observe(seconds)
+            # The response is encoded once the callback returned
+            if has_request_context():
+                g.callback_returned = time.perf_counter()
+
+    return wrapper
+
+
+def lap(phase):
+    # End the running phase of the current callback under this name.
+    running = _running.get()
+    if running is None:
+        return
+    _, start, laps = running
+    now = time.perf_counter()
+    laps[phase] = laps.get(phase, 0) + now - start[0]
+    start[0] = now
+
+
+def callback_name(callback_map, output):
+    # The module.function a callback ID (its output string) runs, the ID itself for anything else.
+    entry = callback_map.get(output)
+    func = entry and entry.get('callback')
+    return f'{func.__module__}.{func.__qualname__}' if func else output
+
+
+def observe_request(name, started, response):
+    now = time.perf_counter()
+    REQUEST_SECONDS.labels(name).observe(now - started)
+    RESPONSE_BYTES.labels(name).observe(response.calculate_content_length() or 0)
+    # Background callbacks ran in another process, their requests only poll for the result
+    if 'callback_returned' in g:
+        PHASE_SECONDS.labels(name, 'serialize').observe(now - g.callback_returned)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def _directory_lock(operation):
+    with open(os.path.join(MULTIPROC_DIR, '.lock'), 'a') as f:
+        fcntl.flock(f, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def compact():
+    # Fold the files of exited processes (every background callback job is one, as are replaced workers) into
+    # one <type>_archive.db per type, so the directory holds a file per live process rather than per job run.
+    with _directory_lock(fcntl.LOCK_EX):
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, '*.db')):
+            prefix, _, pid = os.path.basename(path)[:-len('.db')].rpartition('_')
+            typ = prefix.split('_')[0]
+            if typ not in ADDITIVE_TYPES or not pid.isdigit() or _alive(int(pid)):
+                continue
+            archive = MmapedDict(os.path.join(MULTIPROC_DIR, f'{typ}_archive.db'))
+            try:
+                for key, value, _, _ in MmapedDict.read_all_values_from_file(path):
+                    archive.write_value(key, archive.read_value(key)[0] + value, 0)
+            finally:
+                archive.close()
+            os.remove(path)
+
+
+def render():
+    # (body, content type) of the Prometheus text exposition.
+    if MULTIPROC_DIR:
+        compact()
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Not while a compaction moves samples from one file to the other
+        with _directory_lock(fcntl.LOCK_SH):
+            return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import pandas as pd
+
+STORE_PATH = os.environ.get('ORDER_STORE_PATH', 'data/orders.db')
+
+# Store column -> Orders column
+COLUMNS = {
+    'order_id': 'Order ID',
+    'product_id': 'Product ID',
+    'customer_id': 'Customer ID',
+    'quantity': 'Quantity',
+    'discount': 'Discount',
+    'order_date': 'Order Date'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    customer_id TEXT,
+    quantity INTEGER,
+    discount REAL,
+    order_date TEXT NOT NULL,
+    UNIQUE (order_id, product_id)
+)
+"""
+
+
+class DuplicateOrderError(Exception):
+    pass
+
+
+class OrderStore:
+    # Append-only SQLite log of the orders added through the DataTable page.
+    # Every gunicorn worker appends to and tails the same file, so an order added in one is seen by all.
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets workers keep reading while another one appends
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def append(self, entry):
+        # Insert one order (keyed by Orders column names) and return its sequence number.
+        values = [entry.get(column) for column in COLUMNS.values()]
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    f"INSERT INTO orders ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    values
+                )
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise DuplicateOrderError(f"{entry.get('Order ID')} / {entry.get('Product ID')}")
+
+    def read_since(self, seq):
+        # Orders appended after the given sequence number, oldest first, as an Orders-shaped frame.
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT seq, {', '.join(COLUMNS)} FROM orders WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+
+        frame = pd.DataFrame(rows, columns=['seq'] + list(COLUMNS.values()))
+        frame['Order Date'] = pd.to_datetime(frame['Order Date'])
+        return frame
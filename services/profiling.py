@@ -0,0 +1,88 @@
+import contextvars
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import tempfile
+import time
+from flask import g
+
+# Profiling is off unless a secret is configured; a request opts in by sending it as the X-Profile header
+# or the ?profile= query parameter, e.g. on a callback request replayed with curl.
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'aldi-profiles'))
+# Functions listed in the text summary
+SUMMARY_LINES = int(os.environ.get('PROFILE_SUMMARY_LINES', 30))
+
+# (file name stem, pid of the web process) while a profiled request runs. Background callbacks run in a
+# process forked from the request, which inherits it and profiles the callback itself.
+_target = contextvars.ContextVar('profile_target', default=None)
+
+
+def requested(request):
+    token = request.headers.get('X-Profile') or request.args.get('profile')
+    # Compared as bytes, compare_digest refuses str with non-ASCII characters
+    return bool(PROFILE_SECRET and token) and hmac.compare_digest(token.encode(), PROFILE_SECRET.encode())
+
+
+def start(name):
+    # Profile the rest of this request, saved under the callback's name.
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)[:80]}-{os.getpid()}"
+    g.profile_token = _target.set((stem, os.getpid()))
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def finish(response, summary=False):
+    # Stop the request's profiler and save it; the response names the file, or becomes the summary.
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    stem, _ = _target.get()
+    _target.reset(g.pop('profile_token'))
+
+    path = save(profiler, stem)
+    response.headers['X-Profile-File'] = path
+    if summary:
+        response.set_data(summarize(profiler))
+        response.mimetype = 'text/plain'
+    return response
+
+
+def discard():
+    # Stop the profiler of a request that failed before its response.
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _target.reset(g.pop('profile_token'))
+
+
+def save(profiler, stem):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f'{stem}.prof')
+    profiler.dump_stats(path)
+    return path
+
+
+def summarize(profiler):
+    # Top functions by cumulative time, as printed by pstats.
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    return out.getvalue()
+
+
+def profile_background(func, *args):
+    # Run a callback, profiled when it is the background job of a profiled request. The job's profile goes
+    # next to the request's, which only covers starting the job.
+    target = _target.get()
+    if target is None or target[1] == os.getpid():
+        return func(*args)
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        save(profiler, f'{target[0]}-job')
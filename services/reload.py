@@ -0,0 +1,92 @@
+import contextlib
+import fcntl
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from services.dataset import CACHE_DIR, DATA_PATH, cache_is_current, get_dataset, load_dataset, set_dataset
+from services.lazy import registered, warm_up
+
+# Seconds between checks of the workbook for changes; 0 turns the watcher off
+RELOAD_INTERVAL = float(os.environ.get('RELOAD_INTERVAL', 5))
+
+logger = logging.getLogger(__name__)
+
+# (pid, thread) of the running watcher, so a forked worker starts its own
+_watcher = (None, None)
+_watcher_lock = threading.Lock()
+
+
+def fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@contextlib.contextmanager
+def _refresh_lock():
+    # Held by the process refreshing the Feather cache, across workers (and across the forks of one master)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, '.refresh.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def reload_dataset(path=DATA_PATH):
+    # Load the workbook and everything derived from it next to the dataset being served, then swap it in.
+    # Requests keep the dataset they started with, the next ones get the new one fully built.
+    start = time.perf_counter()
+    if CACHE_DIR:
+        # Every worker watches the workbook, but one refreshes the cache: whichever takes the lock first.
+        # The others wait for it, then find the cache current and only load it.
+        with _refresh_lock():
+            if not cache_is_current(path, CACHE_DIR):
+                # Parse the workbook in another interpreter, which writes the Feather cache the load below
+                # reads. openpyxl parses in pure Python and would hold the GIL against the requests for seconds.
+                subprocess.run([sys.executable, '-m', 'services.dataset', path], check=True)
+    dataset = load_dataset(path).build()
+    set_dataset(dataset)
+    # The pages' own data (e.g. the DataTable rows) follows the new version right away
+    warm_up([name for name in registered() if name != 'Dataset'], rebuild=True)
+    logger.info('Reloaded %s in %.2fs', path, time.perf_counter() - start)
+    return dataset
+
+
+def watch(path=DATA_PATH, interval=RELOAD_INTERVAL):
+    # Reload once the workbook changed and stayed unchanged for an interval, i.e. it is no longer being written.
+    get_dataset()
+    loaded = fingerprint(path)
+    seen = loaded
+    while True:
+        time.sleep(interval)
+        current = fingerprint(path)
+        if current is None or current == loaded or current != seen:
+            seen = current
+            continue
+        try:
+            reload_dataset(path)
+            loaded = current
+        except Exception:
+            # A half-copied or broken workbook; the current dataset stays, the next change is tried again
+            logger.exception('Reloading %s failed', path)
+            loaded = current
+
+
+def start_watcher():
+    # Watch the workbook from a daemon thread, one per process (threads do not survive a fork).
+    global _watcher
+    if RELOAD_INTERVAL <= 0 or _watcher[0] == os.getpid():
+        return _watcher[1]
+    with _watcher_lock:
+        if _watcher[0] != os.getpid():
+            thread = threading.Thread(target=watch, name='dataset-watcher', daemon=True)
+            thread.start()
+            _watcher = (os.getpid(), thread)
+    return _watcher[1]
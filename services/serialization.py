@@ -0,0 +1,17 @@
+import numpy as np
+from plotly.basedatatypes import BaseFigure, BasePlotlyType
+
+
+def to_plain(value):
+    # Figures and traces as plain dicts and lists, keeping the arrays orjson encodes natively (numbers, datetime64).
+    # Dash's encoder then writes the response in one orjson pass instead of falling back to plotly's per-element cleaner.
+    if isinstance(value, (BaseFigure, BasePlotlyType)):
+        value = value.to_plotly_json()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, np.ndarray) and value.dtype.kind not in 'biufM':
+        # Text and other object arrays
+        return value.tolist()
+    return value
@@ -0,0 +1,186 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# DataTable filter operators, by the spellings the table sends
+FILTER_OPERATORS = {
+    'ge': 'ge', '>=': 'ge',
+    'le': 'le', '<=': 'le',
+    'lt': 'lt', '<': 'lt',
+    'gt': 'gt', '>': 'gt',
+    'ne': 'ne', '!=': 'ne',
+    'eq': 'eq', '=': 'eq',
+    'contains': 'contains',
+    'datestartswith': 'datestartswith'
+}
+# Operators that match text, their value stays a string whatever the column holds
+TEXT_OPERATORS = {'contains', 'datestartswith'}
+
+# "{column} operator value", the operator being the token right after the column name. The table prefixes it
+# with s (case sensitive, e.g. "scontains", "s>") or i (case insensitive); a word operator ends at a space.
+FILTER_PART = re.compile(
+    r'\s*\{(?P<name>[^}]*)\}\s*(?P<case>[si]?)(?P<operator>[<>!]=|[<>=]|(?:'
+    + '|'.join(operator for operator in FILTER_OPERATORS if operator.isalpha())
+    + r')(?=\s))\s*(?P<value>.*)',
+    re.S
+)
+
+COMPARISONS = {
+    'ge': lambda column, value: column >= value,
+    'le': lambda column, value: column <= value,
+    'lt': lambda column, value: column < value,
+    'gt': lambda column, value: column > value,
+    'ne': lambda column, value: column != value,
+    'eq': lambda column, value: column == value,
+    'contains': lambda column, value: column.astype(str).str.contains(value, regex=False),
+    'datestartswith': lambda column, value: column.astype(str).str.startswith(value)
+}
+
+
+def split_filter_part(filter_part):
+    # Split one "{column} op value" clause of a DataTable filter_query into (column, operator, value, ignore_case).
+    match = FILTER_PART.fullmatch(filter_part)
+    if match is None:
+        return None, None, None, False
+
+    value = match['value'].strip()
+    quote = value[:1]
+    if quote and quote == value[-1] and quote in ("'", '"', '`'):
+        value = value[1:-1].replace('\\' + quote, quote)
+    return match['name'], FILTER_OPERATORS[match['operator']], value, match['case'] == 'i'
+
+
+def _coerce_value(column, operator, value):
+    if operator not in TEXT_OPERATORS and pd.api.types.is_numeric_dtype(column.dtype):
+        return float(value)
+    return value
+
+
+def _fold_case(column, value):
+    # Lower case text and the value compared with it; numbers have no case.
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column, value
+    return column.astype(str).str.lower(), value.lower()
+
+
+def _distinct_mask(codes, distinct, operator, value, ignore_case):
+    # Evaluate on the distinct values and broadcast through the codes, -1 (missing) never matches.
+    if ignore_case:
+        distinct, value = _fold_case(distinct, value)
+    matches = COMPARISONS[operator](distinct, _coerce_value(distinct, operator, value))
+    matches = np.append(matches.to_numpy(bool, na_value=False), False)
+    return matches[codes]
+
+
+def _clause_mask(column, operator, value, ignore_case=False):
+    compare = COMPARISONS[operator]
+    try:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return _distinct_mask(column.cat.codes.to_numpy(), pd.Series(column.cat.categories), operator, value,
+                                  ignore_case)
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            # Dates are shown as YYYY-MM-DD, so filter on that text, formatted once per distinct day
+            codes, days = pd.factorize(column)
+            return _distinct_mask(codes, pd.Series(days.strftime(DATE_FORMAT)), operator, value, ignore_case)
+        if ignore_case:
+            column, value = _fold_case(column, value)
+        return compare(column, _coerce_value(column, operator, value)).to_numpy(bool, na_value=False)
+    except (TypeError, ValueError):
+        # Value does not fit the column type (e.g. text against a number), nothing matches.
+        return np.zeros(len(column), dtype=bool)
+
+
+def filter_mask(frame, filter_query):
+    # Boolean row mask for a DataTable filter_query, None when nothing is filtered.
+    mask = None
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value, ignore_case = split_filter_part(filter_part)
+        if name not in frame.columns:
+            continue
+        clause = _clause_mask(frame[name], operator, value, ignore_case)
+        mask = clause if mask is None else mask & clause
+    return mask
+
+
+class SortIndex:
+    # Row orders per column, computed on first use and reused by every page request.
+    def __init__(self, frame):
+        self.frame = frame
+        self._orders = {}
+        self._ranks = {}
+        self._lock = threading.Lock()
+
+    def order(self, column, ascending=True):
+        key = (column, ascending)
+        if key not in self._orders:
+            with self._lock:
+                if key not in self._orders:
+                    self._orders[key] = self._build(column, ascending)
+        return self._orders[key]
+
+    def rank(self, column, ascending=True):
+        # Position of every row in the sorted order, so a subset can be sorted without touching the rest.
+        key = (column, ascending)
+        if key not in self._ranks:
+            order = self.order(column, ascending)
+            rank = np.empty(len(order), dtype=np.intp)
+            rank[order] = np.arange(len(order))
+            self._ranks[key] = rank
+        return self._ranks[key]
+
+    def extended(self, frame):
+        # Sort index of frame, i.e. this one's rows with more appended. The orders built so far are merged with
+        # the new rows: already sorted, the stable sort below runs over them in linear time instead of n log n.
+        index = SortIndex(frame)
+        added = np.arange(len(self.frame), len(frame))
+        for (column, ascending), order in list(self._orders.items()):
+            if column is None:
+                continue
+            # Ties keep the row order: old rows in their sorted order, then the new ones by position
+            rows = np.concatenate([order, added])
+            values = frame[column].take(rows).reset_index(drop=True)
+            merged = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            index._orders[(column, ascending)] = rows[merged]
+        return index
+
+    def _build(self, column, ascending):
+        if column is None:
+            rows = np.arange(len(self.frame))
+            return rows if ascending else rows[::-1]
+
+        values = self.frame[column].reset_index(drop=True)
+        return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+class OrdersTable:
+    # DataTable rows and their sort index, replaced together as orders are appended.
+    def __init__(self, frame):
+        self.current = (frame, SortIndex(frame))
+
+    def add(self, rows):
+        # Append rows and merge them into the sort orders built so far, rather than sorting everything again.
+        frame, sort_index = self.current
+        frame = pd.concat([frame, rows], ignore_index=True)
+        self.current = (frame, sort_index.extended(frame))
+
+
+def select_page(sort_index, rows, sort_by, page_current, page_size):
+    # Positions of the requested page and the number of matching rows.
+    # rows holds the matching row positions in ascending order, None meaning every row.
+    column, ascending = None, True
+    if sort_by:
+        column, ascending = sort_by[0]['column_id'], sort_by[0]['direction'] == 'asc'
+
+    start = page_current * page_size
+    if rows is None:
+        order = sort_index.order(column, ascending)
+        return order[start:start + page_size], len(order)
+
+    if column is None and not ascending:
+        rows = rows[::-1]
+    elif column is not None:
+        rows = rows[np.argsort(sort_index.rank(column, ascending)[rows], kind='stable')]
+    return rows[start:start + page_size], len(rows)
@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import plotly.graph_objs as go
+
+# Above this many points a scatter trace is drawn with WebGL, SVG gets sluggish with thousands of markers
+WEBGL_THRESHOLD = int(os.environ.get('WEBGL_THRESHOLD', 1000))
+# Points kept per line trace, about one per horizontal pixel of a chart
+LINE_MAX_POINTS = int(os.environ.get('LINE_MAX_POINTS', 800))
+
+
+def lttb(x, y, max_points):
+    # Positions of the points Largest-Triangle-Three-Buckets keeps: the first and last point, plus per bucket
+    # the point spanning the largest triangle with its kept neighbours, so peaks and dips survive.
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    if x.dtype.kind == 'M':
+        x = x.astype('int64')
+    x = x.astype(float) if x.dtype.kind in 'iuf' else np.arange(n, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    # max_points - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    keep = np.empty(max_points, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        next_hi = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+
+        area = np.abs((x[previous] - next_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (next_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        keep[bucket + 1] = previous
+    return keep
+
+
+def scatter(x, y, **kwargs):
+    # go.Scatter, or its WebGL counterpart once there are more points than WEBGL_THRESHOLD.
+    trace = go.Scattergl if len(y) > WEBGL_THRESHOLD else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def line(x, y, max_points=LINE_MAX_POINTS, **kwargs):
+    # Scatter trace of a series downsampled to max_points with LTTB.
+    x, y = np.asarray(x), np.asarray(y)
+    keep = lttb(x, y, max_points)
+    return scatter(x[keep], y[keep], **kwargs)